@@ -8,7 +8,7 @@ from src.Teacher.Subject.Queries import SubjectQuery_bp
 from src.Teacher.Subject.Results import assessments_bp
 from src.Teacher.Subject.Subjects import TeacherSubject_bp
 from src.Teacher.Teacher import Teacher_bp
-# from src.admin.ReportDownload import report_download_bp
+from src.admin.ReportDownload import report_download_bp
 from src.admin.Students import student_bp
 from src.admin.Subjects import subject_bp
 from src.admin.Campus import campus_bp
@@ -21,10 +21,12 @@ from src.student.Chat import chat_bp
 from src.student.queries import queries_bp
 from src.admin.Announcement import announcement_bp
 from src.student.Assignment import assignments_bp
+from src.QueryMetrics import init_query_metrics
 import os
 
 app = Flask(__name__)
 CORS(app)
+init_query_metrics(app)
 
 app.config['UPLOAD_FOLDER'] = os.path.join(os.getcwd(), 'static/ProfilePictures')
 
@@ -50,7 +52,7 @@ app.register_blueprint(SubjectQuery_bp,url_prefix='/SubjectQuery')
 app.register_blueprint(SubjectAssignment_bp,url_prefix='/SubjectAssignment')
 app.register_blueprint(Chat_bp,url_prefix='/SubjectChat')
 app.register_blueprint(assessments_bp,url_prefix='/SubjectAssessment')
-# app.register_blueprint(report_download_bp,url_prefix='/ReportDownload')
+app.register_blueprint(report_download_bp,url_prefix='/ReportDownload')
 
 
 if __name__ == '__main__':
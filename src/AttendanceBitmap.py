@@ -0,0 +1,229 @@
+import argparse
+from datetime import date, timedelta
+
+from src.DatabaseConnection import Database
+
+db = Database()
+
+# Academic years run from the first of this month to the day before it next year.
+ACADEMIC_YEAR_START_MONTH = 8
+# Weekdays (Monday=0) with no school; streaks skip over them.
+WEEKLY_OFF_DAYS = (6,)
+# subject_id used for the General_Attendance (gate) planes.
+GENERAL = 0
+
+# Longest academic year, in days; sizes the stored planes.
+YEAR_DAYS = 366
+PLANE_BYTES = (YEAR_DAYS + 7) // 8
+
+BITMAP_SCHEMA = f"""
+    CREATE TABLE IF NOT EXISTS attendance_bitmaps (
+        RFID VARCHAR(64) NOT NULL,
+        academic_year SMALLINT NOT NULL,
+        subject_id INT NOT NULL DEFAULT {GENERAL},
+        present VARBINARY({PLANE_BYTES}) NOT NULL,
+        on_leave VARBINARY({PLANE_BYTES}) NOT NULL,
+        updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+        PRIMARY KEY (RFID, academic_year, subject_id)
+    )
+"""
+
+
+def academic_year(day):
+    return day.year if day.month >= ACADEMIC_YEAR_START_MONTH else day.year - 1
+
+
+def year_start(year):
+    return date(year, ACADEMIC_YEAR_START_MONTH, 1)
+
+
+def as_date(value):
+    """Accept a date, a datetime or ISO ``YYYY-MM-DD`` text."""
+    if isinstance(value, str):
+        return date.fromisoformat(value[:10])
+    return value.date() if hasattr(value, "date") else value
+
+
+def _popcount(value):
+    return bin(value).count("1")
+
+
+class AttendanceBits:
+    """One student's attendance for one academic year, one bit per day.
+
+    Bit ``i`` of each plane is the ``i``-th day after year_start(); the
+    present and leave planes are kept exclusive, and a day with neither bit
+    set is absent (or not a school day).
+    """
+
+    def __init__(self, year, present=b"", on_leave=b""):
+        self.year = year
+        self.start = year_start(year)
+        self.days = (year_start(year + 1) - self.start).days
+        self.present = int.from_bytes(bytes(present or b""), "little")
+        self.on_leave = int.from_bytes(bytes(on_leave or b""), "little")
+
+    def index(self, day):
+        offset = (as_date(day) - self.start).days
+        if not 0 <= offset < self.days:
+            raise ValueError(f"{day} is outside academic year {self.year}")
+        return offset
+
+    def mark(self, day, status):
+        """Record ``status`` (Present/Leave/Absent, any case) for ``day``."""
+        bit = 1 << self.index(day)
+        self.present &= ~bit
+        self.on_leave &= ~bit
+        status = (status or "").lower()
+        if status == "present":
+            self.present |= bit
+        elif status == "leave":
+            self.on_leave |= bit
+
+    def planes(self):
+        return (self.present.to_bytes(PLANE_BYTES, "little"),
+                self.on_leave.to_bytes(PLANE_BYTES, "little"))
+
+    def count(self, start=None, end=None):
+        """Present and leave days between ``start`` and ``end`` inclusive."""
+        first = self.index(max(start, self.start)) if start else 0
+        last = self.index(min(end, self.start + timedelta(days=self.days - 1))) if end else self.days - 1
+        if last < first:
+            return {"present": 0, "on_leave": 0}
+        mask = ((1 << (last - first + 1)) - 1) << first
+        return {"present": _popcount(self.present & mask), "on_leave": _popcount(self.on_leave & mask)}
+
+    def monthly(self):
+        """Counts per calendar month of the year that has any attendance."""
+        months = []
+        month_start = self.start
+        while (month_start - self.start).days < self.days:
+            next_month = (month_start.replace(day=28) + timedelta(days=4)).replace(day=1)
+            counts = self.count(month_start, next_month - timedelta(days=1))
+            if counts["present"] or counts["on_leave"]:
+                months.append({"month": month_start.strftime("%Y-%m"), **counts})
+            month_start = next_month
+        return months
+
+    def streaks(self, until=None):
+        """``(current, longest)`` runs of present school days.
+
+        Leave days and WEEKLY_OFF_DAYS neither extend nor break a run; the
+        current run is the one still unbroken at ``until`` (default today).
+        """
+        last = min((until or date.today()) - self.start, timedelta(days=self.days - 1)).days
+        current = longest = 0
+        for offset in range(last + 1):
+            day = self.start + timedelta(days=offset)
+            bit = 1 << offset
+            if self.present & bit:
+                current += 1
+                longest = max(longest, current)
+            elif not self.on_leave & bit and day.weekday() not in WEEKLY_OFF_DAYS:
+                # Today may simply not be marked yet.
+                if offset != last:
+                    current = 0
+        return current, longest
+
+
+def load(rfid, year, subject_id=GENERAL):
+    row = db.fetch_one("""
+        SELECT present, on_leave FROM attendance_bitmaps
+        WHERE RFID = %s AND academic_year = %s AND subject_id = %s
+    """, (str(rfid), year, subject_id), prepared=True)
+    if row is None:
+        return AttendanceBits(year)
+    return AttendanceBits(year, row["present"], row["on_leave"])
+
+
+def count_range(rfid, start, end, subject_id=GENERAL):
+    """Present/leave days for ``rfid`` from ``start`` to ``end``, across academic years."""
+    totals = {"present": 0, "on_leave": 0}
+    for year in range(academic_year(start), academic_year(end) + 1):
+        counts = load(rfid, year, subject_id).count(start, end)
+        totals["present"] += counts["present"]
+        totals["on_leave"] += counts["on_leave"]
+    return totals
+
+
+def record_statuses(tx, day, statuses, subject_id=GENERAL):
+    """Set ``day`` to ``statuses[rfid]`` in each student's bitmap, inside ``tx``."""
+    if not statuses:
+        return
+    tx.db.ensure_schema(BITMAP_SCHEMA)
+    day = as_date(day)
+    year = academic_year(day)
+    statuses = {str(rfid): status for rfid, status in statuses.items()}
+    placeholders = ','.join(['%s'] * len(statuses))
+    existing = {
+        str(row["RFID"]): row for row in tx.fetch_all(f"""
+            SELECT RFID, present, on_leave FROM attendance_bitmaps
+            WHERE academic_year = %s AND subject_id = %s AND RFID IN ({placeholders})
+            FOR UPDATE
+        """, (year, subject_id, *statuses))
+    }
+
+    rows = []
+    for rfid, status in statuses.items():
+        row = existing.get(rfid)
+        bits = AttendanceBits(year, row["present"], row["on_leave"]) if row else AttendanceBits(year)
+        bits.mark(day, status)
+        rows.append((rfid, year, subject_id, *bits.planes()))
+    tx.upsert('attendance_bitmaps', ('RFID', 'academic_year', 'subject_id', 'present', 'on_leave'),
+              rows, update_columns=('present', 'on_leave'))
+
+
+def rebuild(year, rfid=None):
+    """Recompute every bitmap for academic ``year`` (or one student's) from the attendance tables."""
+    db.ensure_schema(BITMAP_SCHEMA)
+    start = year_start(year)
+    end = year_start(year + 1)
+    rfid_filter = " AND RFID = %s" if rfid is not None else ""
+    rfid_params = (str(rfid),) if rfid is not None else ()
+
+    # Present beats Leave beats Absent when a day has several rows.
+    rank = {"absent": 0, "leave": 1, "present": 2}
+    best = {}  # (rfid, subject_id, offset) -> status
+    sources = (
+        (f"SELECT RFID, {GENERAL} AS subject_id, date, Status AS status FROM General_Attendance "
+         f"WHERE date >= %s AND date < %s{rfid_filter}"),
+        (f"SELECT RFID, subject_id, date, attendance_status AS status FROM Subject_Attendance "
+         f"WHERE date >= %s AND date < %s{rfid_filter}"),
+    )
+    for sql in sources:
+        for row in db.iter_rows(sql, (start, end, *rfid_params)):
+            day = as_date(row["date"])
+            status = (row["status"] or "").lower()
+            key = (str(row["RFID"]), row["subject_id"], (day - start).days)
+            if rank.get(status, -1) > rank.get(best.get(key), -1):
+                best[key] = status
+
+    bitmaps = {}
+    for (student, subject_id, offset), status in best.items():
+        bits = bitmaps.get((student, subject_id))
+        if bits is None:
+            bits = bitmaps[(student, subject_id)] = AttendanceBits(year)
+        bits.mark(start + timedelta(days=offset), status)
+
+    with db.transaction() as tx:
+        tx.execute(f"DELETE FROM attendance_bitmaps WHERE academic_year = %s{rfid_filter}",
+                   (year, *rfid_params))
+        tx.upsert('attendance_bitmaps', ('RFID', 'academic_year', 'subject_id', 'present', 'on_leave'),
+                  [(student, year, subject_id, *bits.planes())
+                   for (student, subject_id), bits in bitmaps.items()],
+                  update_columns=('present', 'on_leave'))
+    return len(bitmaps)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rebuild per-student attendance bitmaps.")
+    parser.add_argument("--year", type=int, default=academic_year(date.today()),
+                        help="academic year, by the calendar year it starts in")
+    parser.add_argument("--rfid")
+    args = parser.parse_args(argv)
+    count = rebuild(args.year, args.rfid)
+    print(f"Rebuilt {count} attendance bitmaps for academic year {args.year}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+import argparse
+from datetime import date, timedelta
+
+from src.AttendanceBitmap import WEEKLY_OFF_DAYS
+from src.AttendanceRollup import refresh_students
+from src.DatabaseConnection import Database
+
+db = Database()
+
+# Written to General_Attendance.time for absences recorded by the day close.
+ABSENT_TIME = "00:00:00"
+
+FINALISED_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS attendance_finalised_days (
+        attendance_date DATE NOT NULL PRIMARY KEY,
+        absent_count INT NOT NULL DEFAULT 0,
+        finalised_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+    )
+"""
+
+
+def finalise_day(day, force=False):
+    """Record Absent for every student with no attendance row on ``day``.
+
+    Each absentee also gets TotalDays + 1 (present students were counted by
+    mark_present). A day is finalised at most once, tracked in
+    attendance_finalised_days. Days in WEEKLY_OFF_DAYS, or with no one marked
+    at all, are taken as no-school days and skipped unless ``force`` is set.
+    Returns the number of absences written, or None if the day was skipped.
+    """
+    if not force and day.weekday() in WEEKLY_OFF_DAYS:
+        return None
+    if not db.ensure_schema(FINALISED_SCHEMA):
+        raise RuntimeError("attendance_finalised_days could not be created")
+
+    with db.transaction() as tx:
+        done = tx.fetch_one(
+            "SELECT absent_count FROM attendance_finalised_days WHERE attendance_date = %s FOR UPDATE",
+            (day,))
+        if done is not None:
+            return None
+        if not force and tx.fetch_one("""
+            SELECT 1 AS marked FROM General_Attendance
+            WHERE date >= %s AND date < %s + INTERVAL 1 DAY LIMIT 1
+        """, (day, day)) is None:
+            return None
+
+        absent_count = 0
+        campuses = tx.fetch_all("SELECT DISTINCT campusid FROM Students WHERE campusid IS NOT NULL")
+        for campus in campuses:
+            tx.execute("""
+                INSERT INTO General_Attendance (date, RFID, Status, time)
+                SELECT %s, s.RFID, 'Absent', %s
+                FROM Students s
+                LEFT JOIN General_Attendance ga
+                    ON ga.RFID = s.RFID
+                    AND ga.date >= %s AND ga.date < %s + INTERVAL 1 DAY
+                WHERE s.campusid = %s AND ga.RFID IS NULL
+            """, (day, ABSENT_TIME, day, day, campus["campusid"]))
+            absent_count += max(tx.rowcount, 0)
+
+            # Nothing else writes Absent rows, so each one here is still uncounted.
+            tx.execute("""
+                UPDATE Students s
+                JOIN General_Attendance ga
+                    ON ga.RFID = s.RFID
+                    AND ga.date >= %s AND ga.date < %s + INTERVAL 1 DAY
+                    AND ga.Status = 'Absent'
+                SET s.TotalDays = s.TotalDays + 1
+                WHERE s.campusid = %s
+            """, (day, day, campus["campusid"]))
+
+        tx.execute(
+            "INSERT INTO attendance_finalised_days (attendance_date, absent_count) VALUES (%s, %s)",
+            (day, absent_count))
+        # Same transaction, so a day is never marked finalised with a stale rollup.
+        refresh_students(tx, day)
+
+    return absent_count
+
+
+def finalise_range(start, end=None, force=False):
+    """Finalise each day from ``start`` to ``end`` inclusive; returns {day: absences or None}."""
+    results = {}
+    day = start
+    while day <= (end or start):
+        results[day] = finalise_day(day, force)
+        day += timedelta(days=1)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write end-of-day absences.")
+    parser.add_argument("--from", dest="start", type=date.fromisoformat, default=date.today())
+    parser.add_argument("--to", dest="end", type=date.fromisoformat)
+    parser.add_argument("--force", action="store_true",
+                        help="also finalise weekly off days and days with no attendance")
+    args = parser.parse_args(argv)
+    for day, absences in finalise_range(args.start, args.end, args.force).items():
+        print(f"{day}: " + (f"{absences} absences recorded" if absences is not None else "skipped"))
+
+
+if __name__ == "__main__":
+    main()
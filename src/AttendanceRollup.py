@@ -0,0 +1,257 @@
+import argparse
+from datetime import date, timedelta
+
+from src.DatabaseConnection import Database
+
+db = Database()
+
+# Teacher attendance is written outside this app, so its rollup rows are
+# recomputed once they are older than this many seconds.
+TEACHER_REFRESH_SECONDS = 300
+
+ROLLUP_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS daily_attendance_rollup (
+        campus_id INT NOT NULL,
+        year INT NOT NULL DEFAULT 0,
+        attendance_date DATE NOT NULL,
+        population ENUM('students', 'teachers') NOT NULL,
+        total INT NOT NULL DEFAULT 0,
+        present INT NOT NULL DEFAULT 0,
+        on_leave INT NOT NULL DEFAULT 0,
+        absent INT NOT NULL DEFAULT 0,
+        updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+        PRIMARY KEY (campus_id, attendance_date, population, year)
+    )
+"""
+
+STATUS_COLUMNS = {"Present": "present", "Leave": "on_leave", "Absent": "absent"}
+
+
+def bump_students(tx, day, rfids, status="Present", delta=1):
+    """Add ``delta`` to the ``status`` count of each student's campus/year on ``day``.
+
+    Runs inside the caller's transaction so the rollup commits with the
+    attendance rows it counts. Rows created here get the current roster size,
+    and the first bump of a campus's day creates a zero row for each of its
+    other year groups, so campus_totals() can trust whatever rows it finds.
+    """
+    if not rfids:
+        return
+    tx.db.ensure_schema(ROLLUP_SCHEMA)
+    column = STATUS_COLUMNS[status]
+    placeholders = ','.join(['%s'] * len(rfids))
+    unseeded = [row["campusid"] for row in tx.fetch_all(f"""
+        SELECT DISTINCT s.campusid FROM Students s
+        WHERE s.RFID IN ({placeholders}) AND s.campusid IS NOT NULL
+        AND NOT EXISTS (
+            SELECT 1 FROM daily_attendance_rollup d
+            WHERE d.campus_id = s.campusid AND d.attendance_date = %s AND d.population = 'students'
+        )
+    """, (*rfids, day))]
+    if unseeded:
+        campus_placeholders = ','.join(['%s'] * len(unseeded))
+        tx.execute(f"""
+            INSERT IGNORE INTO daily_attendance_rollup
+                (campus_id, year, attendance_date, population, total)
+            SELECT campusid, COALESCE(year, 0), %s, 'students', COUNT(*)
+            FROM Students
+            WHERE campusid IN ({campus_placeholders})
+            GROUP BY campusid, COALESCE(year, 0)
+        """, (day, *unseeded))
+    tx.execute(f"""
+        INSERT INTO daily_attendance_rollup
+            (campus_id, year, attendance_date, population, total, {column})
+        SELECT s.campusid, COALESCE(s.year, 0), %s, 'students',
+               (SELECT COUNT(*) FROM Students r
+                WHERE r.campusid = s.campusid AND r.year <=> s.year),
+               COUNT(*) * %s
+        FROM Students s
+        WHERE s.RFID IN ({placeholders})
+        GROUP BY s.campusid, s.year
+        ON DUPLICATE KEY UPDATE
+            {column} = {column} + VALUES({column}),
+            total = VALUES(total)
+    """, (day, delta, *rfids))
+
+
+def refresh_students(tx, day, campus_id=None):
+    """Recompute the students rows for ``day`` inside the caller's transaction."""
+    tx.db.ensure_schema(ROLLUP_SCHEMA)
+    _rebuild_students(tx, day, campus_id)
+
+
+def rebuild(start, end=None, campus_id=None, populations=("students", "teachers"), prune=True):
+    """Recompute rollup rows for each day from ``start`` to ``end`` inclusive.
+
+    Totals use today's rosters, so a rebuild of old dates counts students
+    who have since joined or left. Rows are upserted, so concurrent rebuilds
+    of the same day both succeed; ``prune`` first deletes the range, which
+    also drops groups that no longer exist but takes gap locks, so the
+    dashboard's on-read seeding leaves it off.
+    """
+    end = end or start
+    db.ensure_schema(ROLLUP_SCHEMA)
+    campus_filter = " AND campus_id = %s" if campus_id is not None else ""
+    with db.transaction() as tx:
+        for population in populations if prune else ():
+            params = (start, end, population) + ((campus_id,) if campus_id is not None else ())
+            tx.execute(f"""
+                DELETE FROM daily_attendance_rollup
+                WHERE attendance_date BETWEEN %s AND %s AND population = %s{campus_filter}
+            """, params)
+
+        day = start
+        while day <= end:
+            if "students" in populations:
+                _rebuild_students(tx, day, campus_id)
+            if "teachers" in populations:
+                _rebuild_teachers(tx, day, campus_id)
+            day += timedelta(days=1)
+
+
+# Per campus/year counts for one day; %s placeholders are (day, day, day),
+# then the campus id once per filter. MAX() keeps one status per student and
+# prefers Present over Leave over Absent. MySQL does not push the outer
+# campus filter into the grouped derived table, so it is repeated there.
+STUDENT_COUNTS_SELECT = """
+    SELECT s.campusid AS campus_id, COALESCE(s.year, 0) AS year, %s AS attendance_date,
+           'students' AS population, COUNT(*) AS total,
+           SUM(CASE WHEN ga.status = 'Present' THEN 1 ELSE 0 END) AS present,
+           SUM(CASE WHEN ga.status = 'Leave' THEN 1 ELSE 0 END) AS on_leave,
+           SUM(CASE WHEN ga.status = 'Absent' THEN 1 ELSE 0 END) AS absent
+    FROM Students s
+    LEFT JOIN (
+        SELECT a.RFID, MAX(a.Status) AS status
+        FROM General_Attendance a
+        JOIN Students c ON c.RFID = a.RFID
+        WHERE a.date >= %s AND a.date < %s + INTERVAL 1 DAY{attendance_filter}
+        GROUP BY a.RFID
+    ) ga ON ga.RFID = s.RFID
+    WHERE s.campusid IS NOT NULL{campus_filter}
+    GROUP BY s.campusid, COALESCE(s.year, 0)
+"""
+STUDENT_FILTERS = {"attendance_filter": "c.campusid", "campus_filter": "s.campusid"}
+
+# Per campus counts for one day; %s placeholders are (day, day).
+TEACHER_COUNTS_SELECT = """
+    SELECT e.CampusID AS campus_id, 0 AS year, %s AS attendance_date,
+           'teachers' AS population, COUNT(*) AS total,
+           SUM(CASE WHEN ea.status = 'Present' THEN 1 ELSE 0 END) AS present,
+           SUM(CASE WHEN ea.status = 'Leave' THEN 1 ELSE 0 END) AS on_leave,
+           SUM(CASE WHEN ea.status = 'Absent' THEN 1 ELSE 0 END) AS absent
+    FROM employee e
+    LEFT JOIN (
+        SELECT RFID, MAX(Attendance_status) AS status FROM Employee_Attendance
+        WHERE Attendance_date = %s
+        GROUP BY RFID
+    ) ea ON ea.RFID = e.RFID
+    WHERE e.CampusID IS NOT NULL{campus_filter}
+    GROUP BY e.CampusID
+"""
+TEACHER_FILTERS = {"campus_filter": "e.CampusID"}
+
+ROLLUP_INSERT = """
+    INSERT INTO daily_attendance_rollup
+        (campus_id, year, attendance_date, population, total, present, on_leave, absent)
+"""
+
+
+def _counts_query(template, day_params, campus_id, filters):
+    """Fill each ``{slot}`` of ``filters`` (listed in template order) with a campus filter."""
+    if campus_id is None:
+        return template.format(**{slot: "" for slot in filters}), day_params
+    sql = template.format(**{slot: f" AND {column} = %s" for slot, column in filters.items()})
+    return sql, day_params + (campus_id,) * len(filters)
+
+
+ROLLUP_UPSERT = """
+    ON DUPLICATE KEY UPDATE
+        total = VALUES(total), present = VALUES(present),
+        on_leave = VALUES(on_leave), absent = VALUES(absent)
+"""
+
+
+def _rebuild_students(tx, day, campus_id):
+    sql, params = _counts_query(STUDENT_COUNTS_SELECT, (day, day, day), campus_id, STUDENT_FILTERS)
+    tx.execute(ROLLUP_INSERT + sql + ROLLUP_UPSERT, params)
+
+
+def _rebuild_teachers(tx, day, campus_id):
+    sql, params = _counts_query(TEACHER_COUNTS_SELECT, (day, day), campus_id, TEACHER_FILTERS)
+    tx.execute(ROLLUP_INSERT + sql + ROLLUP_UPSERT, params)
+
+
+def live_campus_totals(campus_id, day):
+    """campus_totals() computed straight from the attendance tables.
+
+    Two aggregate queries with sargable date ranges; only one row per
+    campus year leaves MySQL, however large the roster.
+    """
+    totals = {}
+    for population, template, day_params, filters in (
+        ("students", STUDENT_COUNTS_SELECT, (day, day, day), STUDENT_FILTERS),
+        ("teachers", TEACHER_COUNTS_SELECT, (day, day), TEACHER_FILTERS),
+    ):
+        sql, params = _counts_query(template, day_params, campus_id, filters)
+        counts = {"total": 0, "present": 0, "on_leave": 0, "absent": 0}
+        for row in db.fetch_all(sql, params):
+            for key in counts:
+                counts[key] += int(row[key] or 0)
+        totals[population] = counts
+    return totals
+
+
+def campus_totals(campus_id, day):
+    """Per-population totals for a campus on ``day``, summed across years.
+
+    Seeds the day's rows on first read (bump_students() creates every year
+    group of a campus at once, so any students row means they are all
+    there) and refreshes the teacher row once it is older than
+    TEACHER_REFRESH_SECONDS.
+    """
+    if not db.ensure_schema(ROLLUP_SCHEMA):
+        return live_campus_totals(campus_id, day)
+    # The age is computed by MySQL so the app server's clock and zone do not matter.
+    totals_sql = """
+        SELECT population, SUM(total) AS total, SUM(present) AS present,
+               SUM(on_leave) AS on_leave, SUM(absent) AS absent,
+               TIMESTAMPDIFF(SECOND, MIN(updated_at), NOW()) AS age
+        FROM daily_attendance_rollup
+        WHERE campus_id = %s AND attendance_date = %s
+        GROUP BY population
+    """
+    rows = {row["population"]: row for row in db.fetch_all(totals_sql, (campus_id, day))}
+
+    stale = []
+    if "students" not in rows:
+        stale.append("students")
+    teachers = rows.get("teachers")
+    if teachers is None or teachers["age"] is None or teachers["age"] > TEACHER_REFRESH_SECONDS:
+        stale.append("teachers")
+    if stale:
+        try:
+            rebuild(day, campus_id=campus_id, populations=tuple(stale), prune=False)
+        except Exception as e:
+            print("🔥 Rollup seed error:", e)
+            return live_campus_totals(campus_id, day)
+        rows = {row["population"]: row for row in db.fetch_all(totals_sql, (campus_id, day))}
+
+    empty = {"total": 0, "present": 0, "on_leave": 0, "absent": 0}
+    return {
+        population: {key: int(rows.get(population, empty)[key] or 0) for key in empty}
+        for population in ("students", "teachers")
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rebuild the daily attendance rollup.")
+    parser.add_argument("--from", dest="start", type=date.fromisoformat, default=date.today())
+    parser.add_argument("--to", dest="end", type=date.fromisoformat)
+    parser.add_argument("--campus", type=int)
+    args = parser.parse_args(argv)
+    rebuild(args.start, args.end, campus_id=args.campus)
+    print(f"Rebuilt attendance rollup {args.start} to {args.end or args.start}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,17 @@
+import logging
+import re
+import threading
+import time
+from collections import Counter, OrderedDict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+
 import mysql.connector
+import pandas as pd
+from flask import has_request_context, request
+from mysql.connector import errors
+
+from src.QueryCache import normalise_tags, query_cache, read_tables, written_tables
 
 DB_CONFIG = {
     'host': '193.203.162.232',
@@ -9,72 +22,868 @@ DB_CONFIG = {
     'charset': 'utf8mb4',
 }
 
+# Shared by every Database() built with the same DB_CONFIG, so all blueprints
+# draw from one set of connections.
+POOL_CONFIG = {
+    'pool_size': 10,         # max open connections per config
+    'checkout_timeout': 10,  # seconds to wait for a free connection
+    'ping_after': 30,        # ping idle connections older than this on checkout
+}
+
+# Read replicas for fetch_* calls, e.g. [dict(DB_CONFIG, host='10.0.0.12')].
+# Writes, transactions and connect() always use the primary DB_CONFIG.
+REPLICA_CONFIGS = []
+REPLICA_EJECT_SECONDS = 30     # how long a failing replica sits out
+READ_YOUR_WRITES_WINDOW = 5    # seconds after a write that reads stay on the primary
+
+# Server-side prepared statements kept open per pooled connection.
+PREPARED_STATEMENT_CACHE_SIZE = 64
+
+# Bulk writes stop adding rows to a statement at this share of the server's
+# max_allowed_packet, leaving headroom for the SQL text and escaping.
+PACKET_HEADROOM = 0.75
+DEFAULT_CHUNK_SIZE = 1000
+
+# Statements slower than this (seconds) go to the slow query log with an
+# EXPLAIN plan captured once per fingerprint. None disables the log.
+SLOW_QUERY_THRESHOLD = 0.5
+MAX_EXPLAINED_FINGERPRINTS = 500
+
+slow_query_log = logging.getLogger("src.slow_query")
+
+
+class PoolTimeout(errors.PoolError):
+    """Raised when no pooled connection frees up within checkout_timeout."""
+
+
+class ConnectionPool:
+    """Bounded, thread-safe pool of autocommit MySQL connections."""
+
+    def __init__(self, config, pool_size=10, checkout_timeout=10, ping_after=30):
+        self.config = dict(config, autocommit=True)
+        self.pool_size = pool_size
+        self.checkout_timeout = checkout_timeout
+        self.ping_after = ping_after
+
+        self.max_allowed_packet = None  # read from the server on first bulk write
+
+        self._idle = deque()  # (connection, released_at), most recent on the right
+        self._in_use = 0
+        self._cond = threading.Condition()
+
+        self._created = 0
+        self._discarded = 0
+        self._waits = 0
+        self._wait_time = 0.0
+        self._timeouts = 0
+
+    def acquire(self, timeout=None):
+        """Check out a live connection, waiting up to ``timeout`` (default checkout_timeout)."""
+        timeout = self.checkout_timeout if timeout is None else timeout
+        started = None
+        with self._cond:
+            while True:
+                if self._idle:
+                    conn, released_at = self._idle.pop()
+                    break
+                if self._in_use < self.pool_size:
+                    conn, released_at = None, None
+                    break
+                now = time.monotonic()
+                if started is None:
+                    started = now
+                    self._waits += 1
+                remaining = timeout - (now - started)
+                if remaining <= 0:
+                    self._timeouts += 1
+                    self._wait_time += now - started
+                    raise PoolTimeout(
+                        f"No free connection after {timeout}s "
+                        f"(pool_size={self.pool_size})"
+                    )
+                self._cond.wait(remaining)
+            self._in_use += 1
+            if started is not None:
+                self._wait_time += time.monotonic() - started
+
+        # Connecting and pinging happen outside the lock.
+        try:
+            if conn is not None and time.monotonic() - released_at >= self.ping_after:
+                if not conn.is_connected():
+                    self._close_quietly(conn)
+                    conn = None
+            if conn is None:
+                conn = mysql.connector.connect(**self.config)
+                with self._cond:
+                    self._created += 1
+        except Exception:
+            with self._cond:
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+        return conn
+
+    def release(self, conn, broken=False):
+        """Return a connection; broken ones are closed instead of reused."""
+        if not broken:
+            try:
+                if conn.in_transaction:
+                    conn.rollback()
+                if not conn.autocommit:
+                    conn.autocommit = True
+            except errors.Error:
+                broken = True
+        if broken:
+            self._close_quietly(conn)
+        with self._cond:
+            self._in_use -= 1
+            if broken:
+                self._discarded += 1
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    def packet_limit(self, conn):
+        """Return the server's max_allowed_packet, queried once per pool."""
+        if self.max_allowed_packet is None:
+            cursor = conn.cursor()
+            cursor.execute("SELECT @@max_allowed_packet")
+            self.max_allowed_packet = int(cursor.fetchone()[0])
+            cursor.close()
+        return self.max_allowed_packet
+
+    def stats(self):
+        with self._cond:
+            return {
+                'pool_size': self.pool_size,
+                'in_use': self._in_use,
+                'idle': len(self._idle),
+                'created': self._created,
+                'discarded': self._discarded,
+                'waits': self._waits,
+                'wait_time': round(self._wait_time, 4),
+                'timeouts': self._timeouts,
+            }
+
+    @staticmethod
+    def _close_quietly(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(config, **pool_options):
+    """Return the process-wide pool for ``config``, creating it on first use."""
+    key = tuple(sorted(config.items()))
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = ConnectionPool(config, **{**POOL_CONFIG, **pool_options})
+        return pool
+
+
+class ReplicaSet:
+    """Round-robin over read replica pools, ejecting failing ones for a cooldown."""
+
+    def __init__(self, pools, eject_seconds=REPLICA_EJECT_SECONDS):
+        self.pools = pools
+        self.eject_seconds = eject_seconds
+        self._next = 0
+        self._ejected_until = {id(pool): 0.0 for pool in pools}
+        self._lock = threading.Lock()
+
+    def candidates(self):
+        """Healthy pools, starting from the next one in round-robin order."""
+        now = time.monotonic()
+        with self._lock:
+            healthy = [pool for pool in self.pools if self._ejected_until[id(pool)] <= now]
+            if not healthy:
+                return []
+            start = self._next % len(healthy)
+            self._next += 1
+            return healthy[start:] + healthy[:start]
+
+    def eject(self, pool):
+        with self._lock:
+            self._ejected_until[id(pool)] = time.monotonic() + self.eject_seconds
+
+    def stats(self):
+        now = time.monotonic()
+        with self._lock:
+            ejected = {key: until > now for key, until in self._ejected_until.items()}
+        return [
+            dict(pool.stats(), host=pool.config.get('host'), ejected=ejected[id(pool)])
+            for pool in self.pools
+        ]
+
+
+_replica_sets = {}
+
+
+def get_replica_set(configs, **pool_options):
+    """Return the shared ReplicaSet for ``configs``, or None when there are none."""
+    if not configs:
+        return None
+    key = tuple(tuple(sorted(config.items())) for config in configs)
+    pools = [get_pool(config, **pool_options) for config in configs]
+    with _pools_lock:
+        replicas = _replica_sets.get(key)
+        if replicas is None:
+            replicas = _replica_sets[key] = ReplicaSet(pools)
+        return replicas
+
+
+_last_write = ContextVar('last_write', default=None)
+
+
+def reset_read_your_writes():
+    """Forget this context's last write, e.g. at the start of a request.
+
+    Servers that reuse threads would otherwise carry the primary pin from
+    one request into the next.
+    """
+    _last_write.set(None)
+
+# (pool id, DDL) pairs already applied by Database.ensure_schema().
+_ensured_schema = set()
+
+_prepared_stats = Counter()
+_prepared_lock = threading.Lock()
+
+
+def prepared_cursor(conn, query, dictionary=False):
+    """Return the connection's cached prepared cursor for ``query``.
+
+    A prepared cursor re-uses its server-side statement as long as it keeps
+    executing the same SQL text, so each distinct statement gets its own
+    cursor, kept in a small LRU on the pooled connection. Evicted cursors are
+    closed, which deallocates the statement on the server.
+    """
+    cache = getattr(conn, '_prepared_cursors', None)
+    if cache is None:
+        cache = conn._prepared_cursors = OrderedDict()
+    key = (query, dictionary)
+    cursor = cache.get(key)
+    with _prepared_lock:
+        _prepared_stats['hits' if cursor is not None else 'misses'] += 1
+    if cursor is not None:
+        cache.move_to_end(key)
+        return cursor
+
+    cursor = conn.cursor(prepared=True, dictionary=dictionary)
+    cache[key] = cursor
+    if len(cache) > PREPARED_STATEMENT_CACHE_SIZE:
+        _, evicted = cache.popitem(last=False)
+        try:
+            evicted.close()
+        except errors.Error:
+            pass
+        with _prepared_lock:
+            _prepared_stats['evictions'] += 1
+    return cursor
+
+
+def prepared_statement_stats():
+    with _prepared_lock:
+        return {key: _prepared_stats[key] for key in ('hits', 'misses', 'evictions')}
+
+
+def quote_identifier(name):
+    return "`" + str(name).replace("`", "``") + "`"
+
+
+def _estimate_row_size(row):
+    """Rough wire size of one VALUES tuple once escaped into the statement."""
+    size = 4
+    for value in row:
+        if isinstance(value, (bytes, bytearray)):
+            size += 2 * len(value) + 3
+        else:
+            size += len(str(value)) + 3
+    return size
+
+
+def chunk_rows(rows, chunk_size, max_bytes):
+    """Yield lists of rows bounded by both row count and estimated bytes."""
+    chunk, chunk_bytes = [], 0
+    for row in rows:
+        row_bytes = _estimate_row_size(row)
+        if chunk and (len(chunk) >= chunk_size or chunk_bytes + row_bytes > max_bytes):
+            yield chunk
+            chunk, chunk_bytes = [], 0
+        chunk.append(row)
+        chunk_bytes += row_bytes
+    if chunk:
+        yield chunk
+
+
+def build_upsert(table, columns, update_columns=None):
+    """Build an INSERT for executemany() that updates or ignores duplicates.
+
+    ``update_columns`` defaults to every column; pass an empty tuple to keep
+    existing rows untouched (INSERT IGNORE).
+    """
+    if update_columns is None:
+        update_columns = columns
+    column_sql = ", ".join(quote_identifier(c) for c in columns)
+    placeholders = ", ".join(["%s"] * len(columns))
+    if not update_columns:
+        return f"INSERT IGNORE INTO {quote_identifier(table)} ({column_sql}) VALUES ({placeholders})"
+    updates = ", ".join(
+        f"{quote_identifier(c)} = VALUES({quote_identifier(c)})" for c in update_columns
+    )
+    return (
+        f"INSERT INTO {quote_identifier(table)} ({column_sql}) VALUES ({placeholders}) "
+        f"ON DUPLICATE KEY UPDATE {updates}"
+    )
+
+
+_WHITESPACE = re.compile(r"\s+")
+_LITERALS = re.compile(r"'(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.)*\"|\b\d+(?:\.\d+)?\b")
+_VALUE_LISTS = re.compile(r"\(\s*(?:%s|\?)(?:\s*,\s*(?:%s|\?))*\s*\)")
+_REPEATED_LISTS = re.compile(r"\(\?\+\)(?:\s*,\s*\(\?\+\))+")
+
+
+def fingerprint(query):
+    """Normalise SQL text so statements differing only in literals or list lengths match."""
+    query = _WHITESPACE.sub(" ", query).strip()
+    query = _LITERALS.sub("?", query)
+    query = _VALUE_LISTS.sub("(?+)", query)
+    return _REPEATED_LISTS.sub("(?+)", query)
+
+
+class QueryStats:
+    """Statement count, DB time and slowest statements for one request or job."""
+
+    def __init__(self, keep_slowest=5):
+        self.count = 0
+        self.total_time = 0.0
+        self.keep_slowest = keep_slowest
+        self.slowest = []  # [(duration, fingerprint)], slowest first
+        self.repeats = Counter()
+
+    def record(self, query, duration):
+        sql = fingerprint(query)
+        self.count += 1
+        self.total_time += duration
+        self.repeats[sql] += 1
+        if len(self.slowest) < self.keep_slowest or duration > self.slowest[-1][0]:
+            self.slowest.append((duration, sql))
+            self.slowest.sort(key=lambda item: item[0], reverse=True)
+            del self.slowest[self.keep_slowest:]
+
+    def repeated(self, threshold):
+        """Statements run more than ``threshold`` times, a likely N+1 loop."""
+        return {sql: n for sql, n in self.repeats.items() if n > threshold}
+
+    def as_dict(self):
+        return {
+            'query_count': self.count,
+            'db_time_ms': round(self.total_time * 1000, 2),
+            'slowest': [
+                {'sql': sql, 'ms': round(duration * 1000, 2)} for duration, sql in self.slowest
+            ],
+        }
+
+
+_query_stats = ContextVar('query_stats', default=None)
+
+_explained_plans = {}  # fingerprint -> EXPLAIN rows (or the error text)
+_explained_lock = threading.Lock()
+
+
+def params_shape(params):
+    """Describe parameter types without their values, e.g. ``int, 3×str``."""
+    if params is None:
+        return None
+    if isinstance(params, dict):
+        return {key: type(value).__name__ for key, value in params.items()}
+    shape = []
+    for value in params:
+        name = type(value).__name__
+        if shape and shape[-1][0] == name:
+            shape[-1][1] += 1
+        else:
+            shape.append([name, 1])
+    return ", ".join(name if n == 1 else f"{n}×{name}" for name, n in shape)
+
+
+def explained_plans():
+    """Return the EXPLAIN output captured for each slow statement fingerprint."""
+    with _explained_lock:
+        return dict(_explained_plans)
+
+
+def start_query_stats(**options):
+    """Begin collecting QueryStats for the current context; returns a reset token."""
+    return _query_stats.set(QueryStats(**options))
+
+
+def current_query_stats():
+    return _query_stats.get()
+
+
+def stop_query_stats(token):
+    stats = _query_stats.get()
+    _query_stats.reset(token)
+    return stats
+
+
+@contextmanager
+def collect_query_stats(**options):
+    """Collect QueryStats for a block outside a request, e.g. a batch job."""
+    token = start_query_stats(**options)
+    try:
+        yield current_query_stats()
+    finally:
+        stop_query_stats(token)
+
+
+class PooledConnection:
+    """Connection handed out by Database.connect(); close() returns it to the pool."""
+
+    def __init__(self, pool, conn):
+        self._pool = pool
+        self._conn = conn
+        # Callers of connect() manage their own commits, as before pooling.
+        conn.autocommit = False
+
+    def __getattr__(self, name):
+        if self.__dict__.get('_conn') is None:
+            raise errors.OperationalError("Connection has been returned to the pool")
+        return getattr(self._conn, name)
+
+    def close(self):
+        if self.__dict__.get('_conn') is not None:
+            conn, self._conn = self._conn, None
+            self._pool.release(conn)
+
+    def __del__(self):
+        # Error paths in callers sometimes skip close(); don't leak the slot.
+        self.close()
+
+
+class Transaction:
+    """Unit of work pinned to one pooled connection; see Database.transaction().
+
+    Unlike the Database helpers, errors are raised rather than printed so the
+    enclosing ``with`` block can roll back.
+    """
+
+    def __init__(self, db, conn):
+        self.db = db
+        self.conn = conn
+        self.pool = db.pool
+        self.lastrowid = None
+        self.rowcount = 0
+        self.written_tags = set()  # invalidated in the query cache on commit
+
+    def execute(self, query, params=None, tags=None, prepared=False):
+        """Run a write statement and return its lastrowid."""
+        self.written_tags |= written_tables(query) | normalise_tags(tags or ())
+        cursor = prepared_cursor(self.conn, query) if prepared else self.conn.cursor()
+        with self.db._timed(query, params):
+            cursor.execute(query, params)
+        self.lastrowid = cursor.lastrowid
+        self.rowcount = cursor.rowcount
+        if not prepared:
+            cursor.close()
+        return self.lastrowid
+
+    def execute_many(self, query, rows, chunk_size=DEFAULT_CHUNK_SIZE, tags=None):
+        """Run ``query`` once per row, batched; returns total affected rows.
+
+        INSERT ... VALUES statements are sent as one multi-row statement per
+        chunk. Chunks stay under the server's max_allowed_packet.
+        """
+        self.written_tags |= written_tables(query) | normalise_tags(tags or ())
+        max_bytes = int(self.pool.packet_limit(self.conn) * PACKET_HEADROOM) - len(query)
+        total = 0
+        cursor = self.conn.cursor()
+        for chunk in chunk_rows(rows, chunk_size, max_bytes):
+            # The first row stands in for the chunk if the statement is EXPLAINed.
+            with self.db._timed(query, chunk[0] if chunk else None):
+                cursor.executemany(query, chunk)
+            total += max(cursor.rowcount, 0)
+        cursor.close()
+        self.rowcount = total
+        return total
+
+    def upsert(self, table, columns, rows, update_columns=None, chunk_size=DEFAULT_CHUNK_SIZE):
+        """Multi-row INSERT ... ON DUPLICATE KEY UPDATE; see build_upsert()."""
+        return self.execute_many(build_upsert(table, columns, update_columns), rows, chunk_size)
+
+    def fetch_all(self, query, params=None, prepared=False):
+        return self.db._select_all(self.conn, query, params, prepared)
+
+    def fetch_one(self, query, params=None, prepared=False):
+        return self.db._select_one(self.conn, query, params, prepared)
+
+
 class Database:
-    def __init__(self, config=DB_CONFIG):
+    def __init__(self, config=DB_CONFIG, replicas=REPLICA_CONFIGS,
+                 slow_query_threshold=SLOW_QUERY_THRESHOLD,
+                 read_your_writes_window=READ_YOUR_WRITES_WINDOW, **pool_options):
         self.config = config
+        self.slow_query_threshold = slow_query_threshold
+        self.read_your_writes_window = read_your_writes_window
+        self.pool = get_pool(config, **pool_options)
+        self.replicas = get_replica_set(replicas, **pool_options)
 
     def connect(self):
-        return mysql.connector.connect(**self.config)
+        self._mark_write()  # callers of connect() usually write
+        return PooledConnection(self.pool, self.pool.acquire())
 
-    def fetch_data(self, query, params=None):
+    def pool_stats(self):
+        """Return checkout counters for this database's connection pool."""
+        return self.pool.stats()
+
+    def replica_stats(self):
+        """Return per-replica pool counters and ejection state."""
+        return self.replicas.stats() if self.replicas else []
+
+    def _mark_write(self):
+        _last_write.set(time.monotonic())
+
+    def _reads_pinned_to_primary(self):
+        """True shortly after this context wrote, so it reads its own writes."""
+        last_write = _last_write.get()
+        return last_write is not None and time.monotonic() - last_write < self.read_your_writes_window
+
+    def _checkout(self, read=False):
+        """Pick a pool for the statement and check out a connection from it."""
+        if read and self.replicas is not None and not self._reads_pinned_to_primary():
+            for pool in self.replicas.candidates():
+                try:
+                    return pool, pool.acquire()
+                except PoolTimeout:
+                    continue
+                except errors.Error:
+                    self.replicas.eject(pool)
+        return self.pool, self.pool.acquire()
+
+    def _release(self, pool, conn, broken):
+        if broken and pool is not self.pool and self.replicas is not None:
+            self.replicas.eject(pool)
+        pool.release(conn, broken=broken)
+
+    @contextmanager
+    def _connection(self, read=False):
+        """Check out a pooled connection for the duration of the block.
+
+        Reads go to a healthy replica when any are configured; everything
+        else uses the primary.
+        """
+        pool, conn = self._checkout(read)
+        broken = False
+        try:
+            yield conn
+        except (errors.OperationalError, errors.InterfaceError):
+            broken = True
+            raise
+        finally:
+            self._release(pool, conn, broken)
+
+    @contextmanager
+    def _timed(self, query, params=None):
+        """Time a statement (and its fetch) into the current QueryStats and slow log."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - started
+            stats = _query_stats.get()
+            if stats is not None:
+                stats.record(query, duration)
+            if self.slow_query_threshold is not None and duration >= self.slow_query_threshold:
+                self._log_slow_query(query, params, duration)
+
+    def _log_slow_query(self, query, params, duration):
+        sql = fingerprint(query)
+        endpoint = request.endpoint if has_request_context() else None
+        plan = self._explain_once(sql, query, params)
+        slow_query_log.warning(
+            "Slow query %.1fms endpoint=%s params=(%s) sql=%s%s",
+            duration * 1000, endpoint, params_shape(params), sql,
+            f" plan={plan}" if plan is not None else "",
+        )
+
+    def _explain_once(self, sql, query, params):
+        """EXPLAIN ``query`` the first time its fingerprint is slow; None afterwards."""
+        verb = query.lstrip()[:7].upper()
+        if not verb.startswith(("SELECT", "UPDATE", "DELETE", "INSERT", "REPLACE")):
+            return None
+        if params is None and "%s" in query:
+            return None  # placeholders with nothing to bind would only record an error as the plan
+        with _explained_lock:
+            if sql in _explained_plans or len(_explained_plans) >= MAX_EXPLAINED_FINGERPRINTS:
+                return None
+            _explained_plans[sql] = None  # claim it so concurrent requests don't repeat the work
+
+        # Never wait for a connection here; the caller may already hold one.
+        try:
+            conn = self.pool.acquire(timeout=0)
+        except PoolTimeout:
+            with _explained_lock:
+                del _explained_plans[sql]
+            return None
+        broken = False
         try:
-            conn = self.connect()
             cursor = conn.cursor(dictionary=True)
-            cursor.execute(query, params)
-            data = cursor.fetchall()
+            cursor.execute("EXPLAIN " + query, params or ())
+            plan = cursor.fetchall()
             cursor.close()
-            conn.close()
-            return data
+        except (errors.OperationalError, errors.InterfaceError) as e:
+            broken = True
+            plan = str(e)
+        except mysql.connector.Error as e:
+            plan = str(e)
+        finally:
+            self.pool.release(conn, broken=broken)
+        with _explained_lock:
+            _explained_plans[sql] = plan
+        return plan
+
+    @contextmanager
+    def transaction(self):
+        """Run the block on one connection and commit once at the end.
+
+        Usage::
+
+            with db.transaction() as tx:
+                room_id = tx.execute("INSERT INTO ChatRooms ...", params)
+                tx.execute("UPDATE ...", params)
+
+        Any exception rolls the whole block back and is re-raised.
+        """
+        with self._connection() as conn:
+            conn.start_transaction()
+            try:
+                tx = Transaction(self, conn)
+                yield tx
+            except BaseException:
+                conn.rollback()
+                raise
+            conn.commit()
+            self._mark_write()
+            query_cache.invalidate(tx.written_tags)
+
+    def fetch_data(self, query, params=None):
+        try:
+            with self._connection(read=True) as conn:
+                cursor = conn.cursor(dictionary=True)
+                with self._timed(query, params):
+                    cursor.execute(query, params)
+                    data = cursor.fetchall()
+                cursor.close()
+                return data
         except mysql.connector.Error as e:
             print("MySQL Error:", e)
             return []
 
-    def fetch_all(self, query, params=None):
-        """Execute SELECT query and return all results as a list of dictionaries."""
-        try:
-            conn = self.connect()
-            cursor = conn.cursor(dictionary=True)
+    def _cached(self, fetch, query, params, ttl, tags, prepared):
+        """Serve ``fetch(query, params)`` from the query cache for ``ttl`` seconds."""
+        tags = normalise_tags(tags) if tags else read_tables(query)
+        key_params = tuple(sorted(params.items())) if isinstance(params, dict) else tuple(params or ())
+        key = (id(self.pool), fetch.__name__, query, key_params)
+        hit, result = query_cache.get(key)
+        if not hit:
+            generation = query_cache.generation(tags)
+            result = fetch(query, params, prepared)
+            query_cache.put(key, result, ttl, tags, generation)
+        # Callers often modify the rows they get back; keep the cached copy intact.
+        if isinstance(result, list):
+            return [dict(row) for row in result]
+        return dict(result) if result is not None else None
+
+    def invalidate(self, *tags):
+        """Drop cached results read from any of the given tables."""
+        query_cache.invalidate(normalise_tags(tags))
+
+    def cache_stats(self):
+        return query_cache.stats()
+
+    def prepared_stats(self):
+        """Hit/miss counters for the per-connection prepared statement cache."""
+        return prepared_statement_stats()
+
+    def _select_all(self, conn, query, params, prepared):
+        cursor = prepared_cursor(conn, query, dictionary=True) if prepared else conn.cursor(dictionary=True)
+        with self._timed(query, params):
             cursor.execute(query, params or ())
             result = cursor.fetchall()
+        if not prepared:
             cursor.close()
-            conn.close()
-            return result
+        return result
+
+    def _select_one(self, conn, query, params, prepared):
+        if prepared:
+            # Prepared cursors can't buffer; drain them so the cursor stays reusable.
+            rows = self._select_all(conn, query, params, prepared)
+            return rows[0] if rows else None
+        # Buffered so surplus rows never linger on a pooled connection.
+        cursor = conn.cursor(dictionary=True, buffered=True)
+        with self._timed(query, params):
+            cursor.execute(query, params or ())
+        result = cursor.fetchone()  # Fetch only one row
+        cursor.close()
+        return result
+
+    def _fetch_all(self, query, params=None, prepared=False):
+        with self._connection(read=True) as conn:
+            return self._select_all(conn, query, params, prepared)
+
+    def _fetch_one(self, query, params=None, prepared=False):
+        with self._connection(read=True) as conn:
+            return self._select_one(conn, query, params, prepared)
+
+    def fetch_all(self, query, params=None, cache_ttl=None, tags=None, prepared=False):
+        """Execute SELECT query and return all results as a list of dictionaries.
+
+        With ``cache_ttl`` (seconds) the rows come from the shared query cache,
+        tagged with ``tags`` or else the tables the query reads; writes to
+        those tables through Database invalidate them. ``prepared`` runs the
+        statement through the connection's prepared statement cache.
+        """
+        try:
+            if cache_ttl:
+                return self._cached(self._fetch_all, query, params, cache_ttl, tags, prepared)
+            return self._fetch_all(query, params, prepared)
         except mysql.connector.Error as e:
             print("MySQL Error:", e)
             return []
 
-    def fetch_one(self, query, params=None):
+    def fetch_one(self, query, params=None, cache_ttl=None, tags=None, prepared=False):
         """Execute SELECT query and return a single result as a dictionary."""
         try:
-            conn = self.connect()
-            cursor = conn.cursor(dictionary=True)
-            cursor.execute(query, params or ())
-            result = cursor.fetchone()  # Fetch only one row
-            cursor.close()
-            conn.close()
-            return result
+            if cache_ttl:
+                return self._cached(self._fetch_one, query, params, cache_ttl, tags, prepared)
+            return self._fetch_one(query, params, prepared)
         except mysql.connector.Error as e:
             print("🔥 MySQL Error:", e)
             return None  # Return None if an error occurs
 
-    def execute_query(self, query, params=None):
+    def fetch_frame(self, query, params=None, dtypes=None, raise_errors=False):
+        """Execute SELECT query and return a DataFrame built column by column.
+
+        Rows are read as tuples and transposed straight into columns, skipping
+        the per-row dictionaries of fetch_all(). ``dtypes`` maps column names
+        to NumPy/pandas dtypes (e.g. ``"Int64"`` for nullable integers); other
+        columns are inferred one at a time. Errors are printed and give an
+        empty frame unless ``raise_errors`` is set.
+        """
         try:
-            conn = self.connect()
-            cursor = conn.cursor()
-            cursor.execute(query, params)
-            conn.commit()
+            with self._connection(read=True) as conn:
+                cursor = conn.cursor()
+                with self._timed(query, params):
+                    cursor.execute(query, params or ())
+                    names = list(cursor.column_names)
+                    columns = [[] for _ in names]
+                    while True:
+                        batch = cursor.fetchmany(DEFAULT_CHUNK_SIZE)
+                        if not batch:
+                            break
+                        for column, values in zip(columns, zip(*batch)):
+                            column.extend(values)
+                cursor.close()
+        except mysql.connector.Error as e:
+            if raise_errors:
+                raise
+            print("MySQL Error:", e)
+            return pd.DataFrame()
+
+        dtypes = dtypes or {}
+        return pd.DataFrame(
+            {name: pd.Series(values, dtype=dtypes.get(name)) for name, values in zip(names, columns)},
+            columns=names,
+        )
+
+    def iter_rows(self, query, params=None, batch_size=DEFAULT_CHUNK_SIZE, as_tuples=False):
+        """Stream SELECT results from an unbuffered cursor, ``batch_size`` rows at a time.
+
+        Yields dictionaries, or plain tuples in SELECT order when ``as_tuples``
+        is set. The pooled connection is held until the generator is exhausted
+        or closed, and errors are raised rather than printed.
+        """
+        pool, conn = self._checkout(read=True)
+        finished = False
+        try:
+            cursor = conn.cursor(dictionary=not as_tuples)
+            # Only the execute is timed; the caller's pace sets the rest.
+            with self._timed(query, params):
+                cursor.execute(query, params or ())
+            while True:
+                batch = cursor.fetchmany(batch_size)
+                if not batch:
+                    break
+                yield from batch
             cursor.close()
-            conn.close()
+            finished = True
+        finally:
+            # Abandoning the stream leaves unread rows on the socket; dropping
+            # the connection is cheaper than draining them.
+            pool.release(conn, broken=not finished)
+
+    def execute_query(self, query, params=None, tags=None, prepared=False):
+        try:
+            with self._connection() as conn:
+                # Pooled connections run in autocommit mode, so no explicit commit.
+                cursor = prepared_cursor(conn, query) if prepared else conn.cursor()
+                with self._timed(query, params):
+                    cursor.execute(query, params)
+                if not prepared:
+                    cursor.close()
+            self._mark_write()
+            query_cache.invalidate(written_tables(query) | normalise_tags(tags or ()))
         except mysql.connector.Error as e:
             print("MySQL Error:", e)
 
-    def commit(self, conn):
-        """Commit the transaction for an existing connection."""
+    def execute_many(self, query, rows, chunk_size=DEFAULT_CHUNK_SIZE, tags=None):
+        """Batch ``query`` over ``rows`` in one transaction; returns affected rows."""
         try:
-            conn.commit()
+            with self.transaction() as tx:
+                return tx.execute_many(query, rows, chunk_size, tags)
         except mysql.connector.Error as e:
-            print("🔥 MySQL Commit Error:", e)
+            print("MySQL Error:", e)
+            return 0
 
+    def upsert(self, table, columns, rows, update_columns=None, chunk_size=DEFAULT_CHUNK_SIZE):
+        """Multi-row upsert of ``rows`` into ``table`` in one transaction."""
+        try:
+            with self.transaction() as tx:
+                return tx.upsert(table, columns, rows, update_columns, chunk_size)
+        except mysql.connector.Error as e:
+            print("MySQL Error:", e)
+            return 0
 
+    def ensure_schema(self, *statements):
+        """Run idempotent DDL (``CREATE TABLE IF NOT EXISTS ...``) once per process.
 
+        Returns False if a statement failed; it is retried on the next call.
+        """
+        pending = [sql for sql in statements if (id(self.pool), sql) not in _ensured_schema]
+        if not pending:
+            return True
+        try:
+            with self._connection() as conn:
+                cursor = conn.cursor()
+                for sql in pending:
+                    cursor.execute(sql)
+                    _ensured_schema.add((id(self.pool), sql))
+                cursor.close()
+            return True
+        except mysql.connector.Error as e:
+            print("🔥 MySQL Schema Error:", e)
+            return False
 
+    def commit(self, conn):
+        """Commit the transaction for an existing connection."""
+        try:
+            conn.commit()
+        except mysql.connector.Error as e:
+            print("🔥 MySQL Commit Error:", e)
@@ -0,0 +1,215 @@
+import json
+import queue
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+# Scans buffered before the ingestion endpoint starts turning batches away.
+GATE_QUEUE_SIZE = 10000
+# The worker writes whichever comes first: this many scans or this much time.
+GATE_FLUSH_ROWS = 500
+GATE_FLUSH_INTERVAL_MS = 500
+# A failed write is retried this many times, waiting GATE_RETRY_BACKOFF_MS and
+# then twice as long before each next attempt, before its scans count as failed.
+GATE_FLUSH_RETRIES = 5
+GATE_RETRY_BACKOFF_MS = 500
+# Offline sync uploads are applied and acknowledged this many events at a time.
+SYNC_CHUNK_SIZE = 500
+
+
+def parse_scans(body, content_type=""):
+    """Decode a gate upload: NDJSON, a JSON array, or ``{"scans": [...]}``."""
+    text = body.decode("utf-8") if isinstance(body, bytes) else body
+    if "ndjson" not in content_type:
+        try:
+            payload = json.loads(text)
+        except ValueError:
+            payload = None  # several objects, one per line
+        else:
+            if isinstance(payload, dict):
+                return payload["scans"] if "scans" in payload else [payload]
+            return payload
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+
+def scan_time(value):
+    """Scan timestamp from ISO-8601 text or epoch seconds; now if missing."""
+    if value in (None, ""):
+        return datetime.now()
+    if isinstance(value, (int, float)):
+        return datetime.fromtimestamp(value)
+    return datetime.fromisoformat(str(value).replace("Z", "+00:00")).astimezone().replace(tzinfo=None)
+
+
+def valid_rfid(value):
+    """True for an RFID a scan may carry: non-blank text or an integer."""
+    if isinstance(value, bool) or not isinstance(value, (str, int)):
+        return False
+    return bool(str(value).strip())
+
+
+class ScanIngestor:
+    """Buffers gate scans in memory and writes them in batches.
+
+    A per-day seen-set turns repeat taps away before they reach the queue,
+    and a single background worker hands ``flush(day, scans)`` up to
+    ``flush_rows`` scans at a time, at least every ``flush_interval_ms``.
+    The seen-set is per process, so ``flush`` must still dedupe against the
+    database for scans that reached another worker; that also makes a retry
+    safe. Accepted scans have already been acknowledged, so a failed
+    ``flush`` is retried with backoff while new scans wait in the queue.
+    """
+
+    def __init__(self, flush, max_queue=GATE_QUEUE_SIZE, flush_rows=GATE_FLUSH_ROWS,
+                 flush_interval_ms=GATE_FLUSH_INTERVAL_MS, retries=GATE_FLUSH_RETRIES,
+                 retry_backoff_ms=GATE_RETRY_BACKOFF_MS):
+        self.flush = flush
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval_ms / 1000
+        self.retries = retries
+        self.retry_backoff = retry_backoff_ms / 1000
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._seen = {}  # day -> set of RFIDs accepted that day
+        self._lock = threading.Lock()
+        self._worker = None
+        self.counters = Counter()
+        self.devices = Counter()
+
+    def submit(self, scans):
+        """Queue new scans; returns counts of accepted/duplicate/invalid/dropped."""
+        result = Counter(accepted=0, duplicate=0, invalid=0, dropped=0)
+        for scan in scans:
+            try:
+                rfid = scan.get("rfid") if isinstance(scan, dict) else scan
+                scanned_at = scan_time(scan.get("scanned_at") if isinstance(scan, dict) else None)
+            except (TypeError, ValueError, OverflowError, OSError):
+                rfid = None
+            # Anything else would fail the whole batch it is flushed with.
+            if not valid_rfid(rfid):
+                result["invalid"] += 1
+                continue
+
+            day = scanned_at.date()
+            if not self._mark_seen(day, str(rfid)):
+                result["duplicate"] += 1
+                continue
+            try:
+                self._queue.put_nowait((day, rfid, scanned_at.time()))
+            except queue.Full:
+                # Forget it again so the device's retry is not taken for a repeat tap.
+                self._forget(day, [rfid])
+                result["dropped"] += 1
+                continue
+            result["accepted"] += 1
+            if isinstance(scan, dict) and scan.get("device_id"):
+                self.devices[str(scan["device_id"])] += 1
+
+        with self._lock:
+            self.counters.update(result)
+        if result["accepted"]:
+            self._ensure_worker()
+        return dict(result)
+
+    def stats(self):
+        with self._lock:
+            return {
+                **{key: self.counters[key] for key in
+                   ("accepted", "duplicate", "invalid", "dropped", "written", "retries", "failed")},
+                "queued": self._queue.qsize(),
+                "flushes": self.counters["flushes"],
+                "devices": dict(self.devices),
+            }
+
+    def _mark_seen(self, day, rfid):
+        with self._lock:
+            seen = self._seen.get(day)
+            if seen is None:
+                # Only today's (and a late straggler's) sets are worth keeping.
+                for old in sorted(self._seen)[:-1]:
+                    del self._seen[old]
+                seen = self._seen[day] = set()
+            if rfid in seen:
+                return False
+            seen.add(rfid)
+            return True
+
+    def _forget(self, day, rfids):
+        with self._lock:
+            seen = self._seen.get(day)
+            if seen is not None:
+                seen.difference_update(str(rfid) for rfid in rfids)
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="gate-ingest", daemon=True)
+                self._worker.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.flush_rows:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._write(batch)
+
+    def _write(self, batch):
+        by_day = {}
+        for day, rfid, at in batch:
+            by_day.setdefault(day, []).append((rfid, at))
+        for day, scans in by_day.items():
+            for attempt in range(self.retries + 1):
+                try:
+                    self.flush(day, scans)
+                except Exception as e:
+                    print("🔥 Gate ingest flush error:", e)
+                    if attempt < self.retries:
+                        with self._lock:
+                            self.counters["retries"] += 1
+                        time.sleep(self.retry_backoff * 2 ** attempt)
+                        continue
+                    # Let the next tap through instead of silently losing the day.
+                    self._forget(day, [rfid for rfid, _ in scans])
+                    with self._lock:
+                        self.counters["failed"] += len(scans)
+                else:
+                    with self._lock:
+                        self.counters["written"] += len(scans)
+                        self.counters["flushes"] += 1
+                break
+
+
+def iter_ndjson_chunks(stream, chunk_size=SYNC_CHUNK_SIZE):
+    """Yield lists of decoded NDJSON events read line by line from ``stream``.
+
+    Lines that are not valid JSON come through as None so they can be counted.
+    """
+    chunk = []
+    for line in stream:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            chunk.append(json.loads(line))
+        except ValueError:
+            chunk.append(None)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def event_key(event):
+    """The event's idempotency key, or one derived from device, RFID and time."""
+    key = event.get("key") or event.get("idempotency_key")
+    if not key:
+        key = f"{event.get('device_id', '')}:{event.get('rfid')}:{event.get('scanned_at')}"
+    return str(key)[:128]
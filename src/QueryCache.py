@@ -0,0 +1,118 @@
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+
+# Entries kept before the least recently used one is evicted.
+QUERY_CACHE_SIZE = 1024
+
+_IDENT = r"`?(?:\w+`?\.`?)?(\w+)`?"
+_READ_TABLES = re.compile(r"\b(?:FROM|JOIN)\s+" + _IDENT, re.IGNORECASE)
+_WRITE_TABLES = re.compile(
+    r"\b(?:INSERT\s+(?:IGNORE\s+)?INTO|REPLACE\s+INTO|UPDATE|DELETE\s+FROM)\s+" + _IDENT,
+    re.IGNORECASE,
+)
+
+
+def read_tables(query):
+    """Lower-cased table names a SELECT reads from."""
+    return {name.lower() for name in _READ_TABLES.findall(query)}
+
+
+def written_tables(query):
+    """Lower-cased table names an INSERT/REPLACE/UPDATE/DELETE writes to."""
+    return {name.lower() for name in _WRITE_TABLES.findall(query)}
+
+
+def normalise_tags(tags):
+    return {tag.lower() for tag in tags}
+
+
+class QueryCache:
+    """Bounded LRU of SELECT results, invalidated by table tag.
+
+    Every entry carries the tables it was read from. A write to any of
+    those tables drops the entry, and a per-tag generation counter stops a
+    read that raced the write from caching the stale result afterwards.
+    The cache is per process, so TTLs bound staleness across workers.
+    """
+
+    def __init__(self, max_entries=QUERY_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (expires_at, tags, value)
+        self._by_tag = {}              # tag -> set of keys
+        self._generations = Counter()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def generation(self, tags):
+        with self._lock:
+            return tuple(self._generations[tag] for tag in sorted(tags))
+
+    def get(self, key):
+        """Return ``(True, value)`` for a live entry, else ``(False, None)``."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= time.monotonic():
+                if entry is not None:
+                    self._drop(key)
+                self.misses += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True, entry[2]
+
+    def put(self, key, value, ttl, tags, generation):
+        """Cache ``value`` unless one of ``tags`` was invalidated since ``generation``."""
+        with self._lock:
+            if tuple(self._generations[tag] for tag in sorted(tags)) != generation:
+                return
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (time.monotonic() + ttl, tags, value)
+            for tag in tags:
+                self._by_tag.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate(self, tags):
+        """Drop every entry read from any of ``tags``."""
+        with self._lock:
+            for tag in tags:
+                self._generations[tag] += 1
+                for key in self._by_tag.pop(tag, ()):
+                    if key in self._entries:
+                        self._drop(key)
+                        self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_tag.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+            }
+
+    def _drop(self, key):
+        _, tags, _ = self._entries.pop(key)
+        for tag in tags:
+            keys = self._by_tag.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_tag[tag]
+
+
+query_cache = QueryCache()
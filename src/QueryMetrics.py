@@ -0,0 +1,64 @@
+from flask import current_app, g, request
+
+from src.DatabaseConnection import current_query_stats, reset_read_your_writes, start_query_stats, stop_query_stats
+
+# Warn when one SQL statement runs more than this many times in a request.
+REPEAT_WARN_THRESHOLD = 10
+
+_metrics_hooks = []
+
+
+def register_metrics_hook(hook):
+    """Call ``hook(endpoint, stats)`` after every request; usable as a decorator.
+
+    ``stats`` is QueryStats.as_dict() plus a ``repeated`` map of SQL
+    fingerprints that crossed REPEAT_WARN_THRESHOLD.
+    """
+    _metrics_hooks.append(hook)
+    return hook
+
+
+def init_query_metrics(app):
+    """Track per-request SQL counts and timings for every route on ``app``.
+
+    Also starts each request with no read-your-writes pin to the primary.
+    """
+
+    @app.before_request
+    def _start_query_stats():
+        reset_read_your_writes()
+        g.query_stats_token = start_query_stats()
+
+    @app.after_request
+    def _report_query_stats(response):
+        stats = current_query_stats()
+        if stats is None:
+            return response
+
+        repeated = stats.repeated(REPEAT_WARN_THRESHOLD)
+        for sql, count in repeated.items():
+            current_app.logger.warning(
+                "Possible N+1 in %s: ran %d times: %s", request.endpoint, count, sql
+            )
+
+        summary = stats.as_dict()
+        summary['repeated'] = repeated
+        for hook in _metrics_hooks:
+            try:
+                hook(request.endpoint, summary)
+            except Exception as e:
+                print("🔥 Metrics hook error:", e)
+
+        if current_app.debug:
+            response.headers['X-DB-Query-Count'] = str(summary['query_count'])
+            response.headers['X-DB-Time-Ms'] = str(summary['db_time_ms'])
+            if summary['slowest']:
+                slowest = summary['slowest'][0]
+                response.headers['X-DB-Slowest'] = f"{slowest['ms']}ms {slowest['sql'][:200]}"
+        return response
+
+    @app.teardown_request
+    def _stop_query_stats(exc):
+        token = g.pop('query_stats_token', None)
+        if token is not None:
+            stop_query_stats(token)
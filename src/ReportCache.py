@@ -0,0 +1,126 @@
+import hashlib
+import os
+import threading
+import time
+from collections import Counter
+
+from src.DatabaseConnection import Database
+from src.QueryCache import query_cache, read_tables
+from src.ReportStore import REPORT_STORE_FOLDER, report_store
+
+db = Database()
+
+REPORT_CACHE_FOLDER = os.path.join(REPORT_STORE_FOLDER, "cache")
+# A report's data-version probes are re-run after this many seconds even if
+# this process saw no writes to its tables, to catch writes made by other
+# worker processes or outside the app.
+FINGERPRINT_TTL = 60
+
+
+def row_probe(table, columns, where, params=(), alias="t"):
+    """A one-row probe of ``table``'s rows matching ``where``: their count and a
+    checksum over ``columns``, so any insert, delete or edit changes it."""
+    checksum = f"CRC32(CONCAT_WS('|', {', '.join(f'{alias}.{column}' for column in columns)}))"
+    return (f"SELECT COUNT(*) AS row_count, COALESCE(BIT_XOR({checksum}), 0) AS checksum "
+            f"FROM {table} {alias} WHERE {where}", tuple(params))
+
+
+class ReportCache:
+    """Generated workbooks on disk, keyed by report, parameters and data version.
+
+    The data version is the result of the report's probes (see row_probe());
+    it is remembered per report until FINGERPRINT_TTL passes or this process
+    writes to one of the probed tables, so a repeat download in between is
+    answered from disk without a query. The cache key doubles as the ETag.
+    """
+
+    def __init__(self, folder=REPORT_CACHE_FOLDER, fingerprint_ttl=FINGERPRINT_TTL):
+        self.folder = folder
+        self.fingerprint_ttl = fingerprint_ttl
+        self._fingerprints = {}  # (kind, params) -> (checked_at, table generations, fingerprint)
+        self._building = {}      # cache key -> lock held while the file is written
+        self._lock = threading.Lock()
+        self.counters = Counter()
+
+    def fingerprint(self, kind, params, probes):
+        tables = set()
+        for sql, _ in probes:
+            tables |= read_tables(sql)
+        generation = query_cache.generation(tables)
+        key = (kind, params)
+        with self._lock:
+            entry = self._fingerprints.get(key)
+        if entry is not None and entry[1] == generation and time.monotonic() - entry[0] < self.fingerprint_ttl:
+            return entry[2]
+
+        self.counters["probes"] += 1
+        results = []
+        for sql, probe_params in probes:
+            row = db.fetch_one(sql, probe_params)
+            if row is None:
+                return None  # unknown version: never serve from or write to the cache
+            results.append((int(row["row_count"] or 0), int(row["checksum"] or 0)))
+        fingerprint = hashlib.sha256(repr(results).encode()).hexdigest()
+        with self._lock:
+            self._fingerprints[key] = (time.monotonic(), generation, fingerprint)
+        return fingerprint
+
+    def lookup(self, kind, params, probes):
+        """``(path, etag)`` the report is cached under for the current data version.
+
+        The file may not exist yet; both are None when the version is unknown.
+        """
+        params = tuple(sorted((name, str(value)) for name, value in params.items()))
+        fingerprint = self.fingerprint(kind, params, probes)
+        if fingerprint is None:
+            return None, None
+        etag = hashlib.sha256(repr((kind, params, fingerprint)).encode()).hexdigest()[:32]
+        return os.path.join(self.folder, f"{kind}_{etag}.xlsx"), etag
+
+    def has(self, path):
+        """Whether ``path`` (from lookup()) is on disk, counted as a hit or miss."""
+        if os.path.exists(path):
+            self.counters["hits"] += 1
+            report_store.touch(path)
+            return True
+        self.counters["misses"] += 1
+        return False
+
+    def fetch(self, kind, params, probes, build):
+        """``(path, etag)`` of the report, building it with ``build(path)`` on a miss.
+
+        ``build`` writes the workbook to the path it is given; if it writes
+        nothing (no data) the result is ``(None, None)``.
+        """
+        path, etag = self.lookup(kind, params, probes)
+        if etag is None:
+            return self._build_uncached(kind, build)
+
+        with self._lock:
+            lock = self._building.setdefault(etag, threading.Lock())
+        with lock:
+            try:
+                if self.has(path):
+                    return path, etag
+                # Readers only ever see a complete file under the cache name.
+                with report_store.writing(path) as partial:
+                    build(partial)
+            finally:
+                with self._lock:
+                    self._building.pop(etag, None)
+        return (path, etag) if os.path.exists(path) else (None, None)
+
+    def _build_uncached(self, kind, build):
+        """Build into a one-off file; callers delete it once sent (etag is None)."""
+        self.counters["uncached"] += 1
+        path = os.path.join(self.folder, f"{kind}_uncached_{time.time_ns()}.xlsx")
+        with report_store.writing(path) as partial:
+            build(partial)
+        return (path, None) if os.path.exists(path) else (None, None)
+
+    def stats(self):
+        with self._lock:
+            return {key: self.counters[key] for key in ("hits", "misses", "probes", "uncached")}
+
+
+report_cache = ReportCache()
@@ -0,0 +1,207 @@
+import os
+import threading
+import time
+import traceback
+import uuid
+from collections import Counter
+
+from src.ReportStore import REPORT_STORE_FOLDER
+
+# Reports built at once across all campuses.
+REPORT_WORKERS = 4
+# Reports built at once for any one campus; its other jobs wait their turn.
+REPORT_JOBS_PER_CAMPUS = 2
+# Jobs waiting for a worker before new submissions are turned away.
+REPORT_QUEUE_SIZE = 100
+# Finished jobs (and their files) are forgotten this long after they finish.
+REPORT_JOB_TTL = 3600
+
+REPORT_JOBS_FOLDER = os.path.join(REPORT_STORE_FOLDER, "jobs")
+
+XLSX_MIMETYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+
+class QueueFull(Exception):
+    """Raised by ReportJobQueue.submit() when REPORT_QUEUE_SIZE jobs are already waiting."""
+
+
+class ReportJob:
+    def __init__(self, key, campus_id, generate, download_name):
+        self.id = uuid.uuid4().hex
+        self.key = key
+        self.campus_id = str(campus_id)
+        self.generate = generate
+        self.download_name = download_name
+        self.status = "queued"
+        self.progress = 0.0
+        self.file_path = None
+        self.error = None
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+    def to_dict(self):
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "progress": round(self.progress, 3),
+            "campus_id": self.campus_id,
+            "download_name": self.download_name,
+            "error": self.error,
+            "submitted_at": self.submitted_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class ReportJobQueue:
+    """Builds report workbooks on a small pool of background threads.
+
+    ``submit(kind, campus_id, params, generate, download_name)`` returns a
+    job at once; a worker later calls ``generate(output_path, progress)``,
+    which writes the workbook (returning its path if it chose another one)
+    and may call ``progress(fraction)`` as it goes. A submission identical
+    in kind, campus and params to a job still queued or running gets that
+    job back instead of a new one. Workers take the oldest queued job whose
+    campus has fewer than ``per_campus`` jobs running, so one campus cannot
+    hold every worker. Jobs live in this process only; with several worker
+    processes the status and download calls must reach the same one.
+    """
+
+    def __init__(self, workers=REPORT_WORKERS, per_campus=REPORT_JOBS_PER_CAMPUS,
+                 max_queue=REPORT_QUEUE_SIZE, job_ttl=REPORT_JOB_TTL, folder=REPORT_JOBS_FOLDER):
+        self.workers = workers
+        self.per_campus = per_campus
+        self.max_queue = max_queue
+        self.job_ttl = job_ttl
+        self.folder = folder
+        self._jobs = {}      # job id -> ReportJob
+        self._active = {}    # coalescing key -> ReportJob still queued or running
+        self._pending = []   # queued jobs, oldest first
+        self._running = Counter()  # campus id -> jobs running
+        self._cond = threading.Condition()
+        self._threads = []
+        self.counters = Counter()
+
+    def submit(self, kind, campus_id, params, generate, download_name):
+        key = (kind, str(campus_id), tuple(sorted((name, str(value)) for name, value in params.items())))
+        with self._cond:
+            self._prune()
+            job = self._active.get(key)
+            if job is not None:
+                self.counters["coalesced"] += 1
+                return job
+            if len(self._pending) >= self.max_queue:
+                self.counters["rejected"] += 1
+                raise QueueFull(f"{len(self._pending)} reports are already waiting")
+
+            job = ReportJob(key, campus_id, generate, download_name)
+            self._jobs[job.id] = job
+            self._active[key] = job
+            self._pending.append(job)
+            self.counters["submitted"] += 1
+            self._ensure_workers()
+            self._cond.notify()
+        return job
+
+    def get(self, job_id):
+        with self._cond:
+            self._prune()
+            return self._jobs.get(job_id)
+
+    def stats(self):
+        with self._cond:
+            return {
+                **{key: self.counters[key] for key in
+                   ("submitted", "coalesced", "rejected", "done", "failed")},
+                "queued": len(self._pending),
+                "running": sum(self._running.values()),
+                "running_by_campus": {campus: count for campus, count in self._running.items() if count},
+            }
+
+    def _ensure_workers(self):
+        self._threads = [thread for thread in self._threads if thread.is_alive()]
+        while len(self._threads) < self.workers:
+            thread = threading.Thread(target=self._run, name=f"report-job-{len(self._threads)}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _next_job(self):
+        # Caller holds the lock.
+        for job in self._pending:
+            if self._running[job.campus_id] < self.per_campus:
+                self._pending.remove(job)
+                self._running[job.campus_id] += 1
+                return job
+        return None
+
+    def _run(self):
+        while True:
+            with self._cond:
+                job = self._next_job()
+                while job is None:
+                    self._cond.wait()
+                    job = self._next_job()
+                job.status = "running"
+                job.started_at = time.time()
+            self._build(job)
+            with self._cond:
+                self._running[job.campus_id] -= 1
+                self._active.pop(job.key, None)
+                job.generate = None
+                # A campus slot freed up; a job that was skipped may now go.
+                self._cond.notify_all()
+
+    def _build(self, job):
+        def progress(fraction):
+            job.progress = min(max(float(fraction), 0.0), 1.0)
+
+        try:
+            os.makedirs(self.folder, exist_ok=True)
+            output_path = os.path.join(self.folder, f"{job.id}.xlsx")
+            file_path = job.generate(output_path, progress) or output_path
+            if not os.path.exists(file_path) or os.path.getsize(file_path) == 0:
+                raise ValueError("No data found for this report")
+        except Exception as e:
+            if not isinstance(e, ValueError):
+                traceback.print_exc()
+            print("🔥 Report job error:", e)
+            status, file_path, job.error = "failed", None, str(e)
+        else:
+            status, job.progress = "done", 1.0
+        with self._cond:
+            job.file_path = file_path
+            job.status = status
+            job.finished_at = time.time()
+            self.counters[status] += 1
+
+    def _prune(self):
+        # Caller holds the lock.
+        cutoff = time.time() - self.job_ttl
+        for job in [job for job in self._jobs.values() if job.finished_at and job.finished_at < cutoff]:
+            del self._jobs[job.id]
+            if job.file_path and os.path.dirname(job.file_path) == self.folder:
+                try:
+                    os.remove(job.file_path)
+                except OSError:
+                    pass
+
+
+report_jobs = ReportJobQueue()
+
+
+def job_status(job_id, download_url):
+    """``(body, status)`` for a job status request; ``download_url`` is set once it is done."""
+    job = report_jobs.get(job_id)
+    if job is None:
+        return {"success": False, "error": "Unknown or expired job"}, 404
+    body = {"success": True, **job.to_dict()}
+    if job.status == "done":
+        body["download_url"] = download_url
+    return body, 200
+
+
+def submit_response(job, status_url):
+    """``(body, status, headers)`` for a newly submitted (or coalesced) job."""
+    body = {"success": True, **job.to_dict(), "status_url": status_url}
+    return body, 202, {"Location": status_url}
@@ -0,0 +1,145 @@
+import os
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+REPORT_STORE_FOLDER = os.path.join(os.getcwd(), "generated_reports")
+# Total size of every file under REPORT_STORE_FOLDER; least recently used
+# files are deleted past it.
+REPORT_STORE_QUOTA_BYTES = 2 * 1024 ** 3
+# Files unused for this long are deleted whatever the total size.
+REPORT_STORE_MAX_AGE = 7 * 24 * 3600
+# Files used more recently than this are never evicted, so a download that
+# has just been handed a path does not lose it before it is opened.
+REPORT_STORE_MIN_IDLE = 60
+# Half-written files left by a crashed writer are deleted after this long.
+PARTIAL_MAX_AGE = 3600
+PARTIAL_PREFIX = "."
+
+
+class ReportStore:
+    """The generated_reports tree, kept under a size quota.
+
+    Files are written under a dot-prefixed name and moved into place when
+    complete. A file's access time records its last use (touch() sets it
+    on every cache hit), so eviction order survives restarts and is shared
+    by every worker process using the same folder. Each write expires files
+    older than ``max_age``, then evicts least recently used files until the
+    total is back under ``quota_bytes``.
+    """
+
+    def __init__(self, folder=REPORT_STORE_FOLDER, quota_bytes=REPORT_STORE_QUOTA_BYTES,
+                 max_age=REPORT_STORE_MAX_AGE, min_idle=REPORT_STORE_MIN_IDLE):
+        self.folder = folder
+        self.quota_bytes = quota_bytes
+        self.max_age = max_age
+        self.min_idle = min_idle
+        self._lock = threading.Lock()
+        self.counters = Counter()
+
+    @contextmanager
+    def writing(self, path):
+        """Yield a temporary path next to ``path``; it becomes ``path`` if written when the block exits."""
+        directory, name = os.path.split(path)
+        os.makedirs(directory, exist_ok=True)
+        root, ext = os.path.splitext(name)
+        # Keeps the extension pandas picks the writer engine from.
+        partial = os.path.join(directory, f"{PARTIAL_PREFIX}{root}.{os.getpid()}.{threading.get_ident()}{ext}")
+        try:
+            yield partial
+            if os.path.exists(partial) and os.path.getsize(partial) > 0:
+                os.replace(partial, path)
+                with self._lock:
+                    self.counters["writes"] += 1
+                    self.counters["written_bytes"] += os.path.getsize(path)
+        finally:
+            if os.path.exists(partial):
+                os.remove(partial)
+        if os.path.exists(path):
+            self.enforce(keep=path)
+
+    def touch(self, path):
+        """Mark ``path`` as just used, moving it to the back of the eviction order."""
+        try:
+            os.utime(path, (time.time(), os.stat(path).st_mtime))
+        except OSError:
+            pass
+
+    def discard(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def take(self, path):
+        """Open ``path`` for reading and delete it; the open file stays readable until closed.
+
+        For one-off files handed to send_file(): nothing is left on disk
+        once the response is sent, however it ends.
+        """
+        handle = open(path, "rb")
+        self.discard(path)
+        return handle
+
+    def enforce(self, keep=None):
+        """Expire old files and evict the least recently used past the quota."""
+        now = time.time()
+        with self._lock:
+            files, total = [], 0
+            for path, stat in self._scan():
+                name = os.path.basename(path)
+                if name.startswith(PARTIAL_PREFIX):
+                    if now - stat.st_mtime > PARTIAL_MAX_AGE:
+                        self._delete(path, "partials_removed")
+                    continue
+                last_used = max(stat.st_atime, stat.st_mtime)
+                if now - last_used > self.max_age and path != keep:
+                    self._delete(path, "expired")
+                    continue
+                files.append((last_used, path, stat.st_size))
+                total += stat.st_size
+
+            files.sort()
+            count = len(files)
+            for last_used, path, size in files:
+                if total <= self.quota_bytes:
+                    break
+                if path == keep or now - last_used < self.min_idle:
+                    continue
+                if self._delete(path, "evictions"):
+                    self.counters["evicted_bytes"] += size
+                    total -= size
+                    count -= 1
+            self.counters["bytes_used"] = total
+            self.counters["files"] = count
+
+    def stats(self):
+        self.enforce()
+        with self._lock:
+            return {
+                "quota_bytes": self.quota_bytes,
+                **{key: self.counters[key] for key in
+                   ("bytes_used", "files", "writes", "written_bytes", "evictions", "evicted_bytes",
+                    "expired", "partials_removed")},
+            }
+
+    def _scan(self):
+        for directory, _, names in os.walk(self.folder):
+            for name in names:
+                path = os.path.join(directory, name)
+                try:
+                    yield path, os.stat(path)
+                except OSError:
+                    continue  # removed by another process
+
+    def _delete(self, path, counter):
+        try:
+            os.remove(path)
+        except OSError:
+            return False
+        self.counters[counter] += 1
+        return True
+
+
+report_store = ReportStore()
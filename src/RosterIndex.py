@@ -0,0 +1,93 @@
+import threading
+import time
+from datetime import date
+
+from src.DatabaseConnection import Database
+
+db = Database()
+
+# Rosters are reloaded after this long even without an invalidation, to pick
+# up students added through another worker process.
+ROSTER_TTL = 300
+# Today's marked set is re-read from the database this often, for the same reason;
+# marks made by this process are visible immediately.
+MARKED_REFRESH_SECONDS = 30
+# year=0 on the attendance screens means every one of these years.
+ALL_YEARS = (1, 2)
+
+
+class RosterIndex:
+    """In-process rosters per (campus, year) and the RFIDs marked per day.
+
+    Unmarked students are then a set difference in memory rather than an
+    anti-join per poll. Rosters are dropped by invalidate() when students
+    are added or edited; marks are added by mark_present as they commit.
+    """
+
+    def __init__(self, roster_ttl=ROSTER_TTL, marked_refresh=MARKED_REFRESH_SECONDS):
+        self.roster_ttl = roster_ttl
+        self.marked_refresh = marked_refresh
+        self._rosters = {}  # (campus_id, year) -> (loaded_at, [{"rfid", "student_name"}])
+        self._marked = {}   # day -> (loaded_at, set of str RFIDs)
+        self._lock = threading.Lock()
+
+    def roster(self, campus_id, year):
+        key = (campus_id, year)
+        with self._lock:
+            entry = self._rosters.get(key)
+        if entry is not None and time.monotonic() - entry[0] < self.roster_ttl:
+            return entry[1]
+
+        years = ALL_YEARS if year == 0 else (year,)
+        placeholders = ','.join(['%s'] * len(years))
+        students = list(db.iter_rows(f"""
+            SELECT rfid, student_name FROM Students
+            WHERE campusid = %s AND year IN ({placeholders})
+        """, (campus_id, *years)))
+        with self._lock:
+            self._rosters[key] = (time.monotonic(), students)
+        return students
+
+    def marked(self, day):
+        with self._lock:
+            entry = self._marked.get(day)
+        if entry is not None and time.monotonic() - entry[0] < self.marked_refresh:
+            return entry[1]
+
+        rows = db.iter_rows("""
+            SELECT DISTINCT RFID FROM General_Attendance
+            WHERE date >= %s AND date < %s + INTERVAL 1 DAY
+        """, (day, day))
+        marked = {str(row["RFID"]) for row in rows}
+        with self._lock:
+            # Keep marks this process added while the query ran.
+            if day in self._marked:
+                marked |= self._marked[day][1]
+            self._marked = {day: (time.monotonic(), marked)}
+        return marked
+
+    def add_marked(self, day, rfids):
+        """Record RFIDs committed as marked on ``day`` (a date or ISO string)."""
+        if isinstance(day, str):
+            day = date.fromisoformat(day[:10])
+        with self._lock:
+            entry = self._marked.get(day)
+            if entry is not None:
+                entry[1].update(str(rfid) for rfid in rfids)
+
+    def unmarked(self, campus_id, year, day):
+        marked = self.marked(day)
+        return [student for student in self.roster(campus_id, year)
+                if str(student["rfid"]) not in marked]
+
+    def invalidate(self, campus_id=None):
+        """Forget cached rosters, for one campus or all of them."""
+        with self._lock:
+            if campus_id is None:
+                self._rosters.clear()
+            else:
+                for key in [key for key in self._rosters if str(key[0]) == str(campus_id)]:
+                    del self._rosters[key]
+
+
+roster_index = RosterIndex()
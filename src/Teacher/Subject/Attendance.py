@@ -1,6 +1,8 @@
 from flask import request, jsonify
 from src.DatabaseConnection import Database
+from src.AttendanceBitmap import record_statuses
 from flask import Blueprint
+from collections import defaultdict
 
 SubjectAttendance_bp = Blueprint('SubjectAttendance', __name__)
 db = Database()
@@ -56,25 +58,79 @@ def save_subject_attendance(subject_id):
     records = data['records']
 
     try:
-        # Delete existing attendance records
-        delete_query = "DELETE FROM Subject_Attendance WHERE subject_id = %s AND date = %s"
-        db.execute_query(delete_query, (subject_id, date))
-
-        # Insert new attendance records
-        insert_query = """
-        INSERT INTO Subject_Attendance 
-        (subject_id, RFID, date, time, attendance_status)
-        VALUES (%s, %s, %s, %s, %s)
-        """
-        for record in records:
-            db.execute_query(insert_query, (
-                subject_id,
-                record['rfid'],
-                date,
-                record['time'],
-                record['attendance_status']
-            ))
-
-        return jsonify({'success': True})
+        incoming = {str(record['rfid']): record for record in records}
+
+        with db.transaction() as tx:
+            current_query = """
+            SELECT RFID, attendance_status
+            FROM Subject_Attendance
+            WHERE subject_id = %s AND date = %s
+            FOR UPDATE
+            """
+            current = defaultdict(list)
+            for row in tx.fetch_all(current_query, (subject_id, date)):
+                current[str(row['RFID'])].append(row['attendance_status'])
+
+            # A record only changes when its status does; time rides along.
+            inserted = [rfid for rfid in incoming if rfid not in current]
+            deleted = [rfid for rfid in current if rfid not in incoming]
+            updated = [
+                rfid for rfid, statuses in current.items()
+                if rfid in incoming and statuses != [incoming[rfid]['attendance_status']]
+            ]
+            # Duplicate rows for a student are rewritten rather than updated in place.
+            rewritten = [rfid for rfid in updated if len(current[rfid]) > 1]
+            updated_in_place = [rfid for rfid in updated if len(current[rfid]) == 1]
+
+            removed = deleted + rewritten
+            if removed:
+                placeholders = ','.join(['%s'] * len(removed))
+                delete_query = f"""
+                DELETE FROM Subject_Attendance
+                WHERE subject_id = %s AND date = %s AND RFID IN ({placeholders})
+                """
+                tx.execute(delete_query, (subject_id, date, *removed))
+
+            if updated_in_place:
+                cases = ' '.join(['WHEN %s THEN %s'] * len(updated_in_place))
+                placeholders = ','.join(['%s'] * len(updated_in_place))
+                update_query = f"""
+                UPDATE Subject_Attendance
+                SET attendance_status = CASE RFID {cases} END,
+                    time = CASE RFID {cases} END
+                WHERE subject_id = %s AND date = %s AND RFID IN ({placeholders})
+                """
+                status_params = [value for rfid in updated_in_place
+                                 for value in (rfid, incoming[rfid]['attendance_status'])]
+                time_params = [value for rfid in updated_in_place
+                               for value in (rfid, incoming[rfid]['time'])]
+                tx.execute(update_query, (*status_params, *time_params, subject_id, date, *updated_in_place))
+
+            added = inserted + rewritten
+            if added:
+                insert_query = """
+                INSERT INTO Subject_Attendance 
+                (subject_id, RFID, date, time, attendance_status)
+                VALUES (%s, %s, %s, %s, %s)
+                """
+                tx.execute_many(insert_query, [(
+                    subject_id,
+                    incoming[rfid]['rfid'],
+                    date,
+                    incoming[rfid]['time'],
+                    incoming[rfid]['attendance_status']
+                ) for rfid in added])
+
+            changes = {rfid: incoming[rfid]['attendance_status'] for rfid in inserted + updated}
+            changes.update({rfid: None for rfid in deleted})
+            record_statuses(tx, date, changes, subject_id=subject_id)
+
+        return jsonify({
+            'success': True,
+            'inserted': [incoming[rfid]['rfid'] for rfid in inserted],
+            'updated': [incoming[rfid]['rfid'] for rfid in updated],
+            'deleted': deleted,
+            'unchanged': len(incoming) - len(inserted) - len(updated),
+        })
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -18,11 +18,12 @@ def get_avatar(name):
 def get_chat_room(subject_id):
     room = db.fetch_one("SELECT room_id FROM ChatRooms WHERE subject_id = %s", (subject_id,))
     if not room:
-        db.execute_query(
-            "INSERT INTO ChatRooms (subject_id, created_at) VALUES (%s, %s)",
-            (subject_id, datetime.utcnow())
-        )
-        room = db.fetch_one("SELECT room_id FROM ChatRooms WHERE subject_id = %s", (subject_id,))
+        with db.transaction() as tx:
+            room_id = tx.execute(
+                "INSERT INTO ChatRooms (subject_id, created_at) VALUES (%s, %s)",
+                (subject_id, datetime.utcnow())
+            )
+        return jsonify({'room_id': room_id})
     return jsonify({'room_id': room['room_id']})
 
 
@@ -73,10 +74,11 @@ def send_message():
         INSERT INTO Messages (message_text, room_id, sender_rfid, sent_at)
         VALUES (%s, %s, %s, %s)
         """,
-        (data['text'], data['room_id'], data['sender_rfid'], datetime.utcnow())
+        (data['text'], data['room_id'], data['sender_rfid'], datetime.utcnow()),
+        prepared=True,
     )
 
-    sender = db.fetch_one("SELECT name, role FROM users WHERE rfid = %s", (data['sender_rfid'],))
+    sender = db.fetch_one("SELECT name, role FROM users WHERE rfid = %s", (data['sender_rfid'],), prepared=True)
     return jsonify({
         'text': data['text'],
         'room_id': data['room_id'],
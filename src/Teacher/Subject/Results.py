@@ -381,34 +381,17 @@ def submit_marks():
     is_quiz = data['is_quiz']
 
     try:
-        conn = db.connect()
-        cursor = conn.cursor()
-        conn.start_transaction()
-
-        for mark in marks:
-            rfid = mark['rfid']
-            marks_achieved = mark['marks_achieved']
+        rows = [(assessment_id, mark['rfid'], mark['marks_achieved']) for mark in marks]
 
+        with db.transaction() as tx:
             if is_quiz:
-                cursor.execute("""
-                    INSERT INTO quiz_marks (quiz_id, rfid, marks_achieved)
-                    VALUES (%s, %s, %s)
-                    ON DUPLICATE KEY UPDATE marks_achieved = %s
-                """, (assessment_id, rfid, marks_achieved, marks_achieved))
+                tx.upsert('quiz_marks', ('quiz_id', 'rfid', 'marks_achieved'), rows,
+                          update_columns=('marks_achieved',))
             else:
-                cursor.execute("""
-                    INSERT INTO assessments_marks (assessment_id, rfid, marks_achieved)
-                    VALUES (%s, %s, %s)
-                    ON DUPLICATE KEY UPDATE marks_achieved = %s
-                """, (assessment_id, rfid, marks_achieved, marks_achieved))
-
-        conn.commit()
-        cursor.close()
-        conn.close()
+                tx.upsert('assessments_marks', ('assessment_id', 'rfid', 'marks_achieved'), rows,
+                          update_columns=('marks_achieved',))
 
         return jsonify({'message': 'Marks submitted successfully'}), 201
 
     except Exception as e:
-        if conn:
-            conn.rollback()
         return jsonify({'error': f'Database error: {str(e)}'}), 500
\ No newline at end of file
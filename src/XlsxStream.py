@@ -0,0 +1,110 @@
+import os
+import threading
+from itertools import chain
+
+import xlsxwriter
+
+# Bytes handed to the HTTP response at a time.
+STREAM_CHUNK_BYTES = 64 * 1024
+
+
+def peek(rows):
+    """``rows`` as an iterator with its first item still in it, or None if it is empty."""
+    rows = iter(rows)
+    first = next(rows, None)
+    if first is None:
+        return None
+    return chain((first,), rows)
+
+
+def write_table(target, header, rows, sheet_name="Sheet1"):
+    """Write ``header`` and then ``rows`` (sequences) to a new workbook at ``target``.
+
+    ``target`` is a path or a writable binary file. Uses xlsxwriter's
+    constant_memory mode, which flushes each row to a temporary file once
+    the next one starts, so memory stays flat however many rows there are.
+    Rows must come in sheet order. Returns the number of data rows.
+    """
+    workbook = xlsxwriter.Workbook(target, {"constant_memory": True})
+    try:
+        worksheet = workbook.add_worksheet(sheet_name)
+        worksheet.write_row(0, 0, header, workbook.add_format({"bold": True, "border": 1}))
+        count = 0
+        for count, row in enumerate(rows, start=1):
+            worksheet.write_row(count, 0, row)
+    finally:
+        workbook.close()
+    return count
+
+
+class _PipeWriter:
+    """The write end of the response pipe, optionally copying every byte to ``copy``.
+
+    It has no tell(), so zipfile writes the workbook as a stream.
+    """
+
+    def __init__(self, fd, copy=None):
+        self._pipe = os.fdopen(fd, "wb")
+        self._copy = copy
+
+    def write(self, data):
+        if self._pipe.closed:
+            # An abandoned zipfile finishing itself off when it is garbage collected.
+            return len(data)
+        self._pipe.write(data)
+        if self._copy is not None:
+            self._copy.write(data)
+        return len(data)
+
+    def flush(self):
+        if not self._pipe.closed:
+            self._pipe.flush()
+
+    def close(self):
+        self._pipe.close()
+
+
+def stream_workbook(write, save_as=None, store=None, chunk_size=STREAM_CHUNK_BYTES):
+    """Yield the bytes of a workbook as ``write(fileobj)`` produces them.
+
+    ``write`` runs on its own thread and writes the workbook to ``fileobj``
+    (see write_table()); the bytes reach the caller, typically an HTTP
+    response, as soon as xlsxwriter emits them. With ``save_as`` and a
+    ReportStore ``store``, a copy is saved there too, but only if the whole
+    workbook was written.
+    """
+    read_fd, write_fd = os.pipe()
+    errors = []
+
+    def produce():
+        pipe = None
+        try:
+            if save_as is None:
+                pipe = _PipeWriter(write_fd)
+                write(pipe)
+            else:
+                with store.writing(save_as) as partial, open(partial, "wb") as copy:
+                    pipe = _PipeWriter(write_fd, copy)
+                    write(pipe)
+        except Exception as e:
+            # Includes the broken pipe when the client goes away; the copy is discarded either way.
+            errors.append(e)
+        finally:
+            if pipe is not None:
+                try:
+                    pipe.close()
+                except OSError:
+                    pass
+            else:
+                os.close(write_fd)
+
+    threading.Thread(target=produce, name="xlsx-stream", daemon=True).start()
+    with os.fdopen(read_fd, "rb") as reader:
+        while True:
+            chunk = reader.read1(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+    if errors:
+        # Too late for an error status; the client sees a truncated download.
+        print("🔥 Workbook stream error:", errors[0])
@@ -1,16 +1,27 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify, url_for
 from src.DatabaseConnection import Database
 from datetime import date,datetime
 from collections import defaultdict
 import os
-import pandas as pd
-from flask import send_from_directory
+from flask import send_file, send_from_directory
 import traceback
+from werkzeug.http import quote_etag
+from src.AttendanceBitmap import academic_year, load as load_bitmap, record_statuses, year_start
+from src.AttendanceRollup import bump_students, campus_totals, live_campus_totals
+from src.RosterIndex import ALL_YEARS, roster_index
+from src.GateIngest import ScanIngestor, event_key, iter_ndjson_chunks, parse_scans, scan_time, valid_rfid
+from src.ReportCache import report_cache, row_probe
+from src.ReportStore import report_store
+from src.XlsxStream import peek, stream_workbook, write_table
+from src.ReportJobs import QueueFull, XLSX_MIMETYPE, job_status, report_jobs, submit_response
 
 
 db = Database()
 attendance_bp = Blueprint('attendance_bp', __name__)
 
+# Absence dates returned per subject by attendance_summary.
+RECENT_ABSENCES_LIMIT = 5
+
 GENERATED_FOLDER = os.path.join(os.getcwd(), "generated_reports")
 os.makedirs(GENERATED_FOLDER, exist_ok=True)
 
@@ -23,63 +34,35 @@ def get_attendance():
         return jsonify({"success": False, "error": "Missing campus_id"}), 400
 
     try:
-        today = date.today().strftime('%Y-%m-%d')
+        # ?live=true skips the rollup and aggregates the attendance tables directly.
+        if request.args.get('live', '').lower() in ('1', 'true'):
+            totals = live_campus_totals(campus_id, date.today())
+        else:
+            totals = campus_totals(campus_id, date.today())
 
         # ---------- STUDENT ATTENDANCE ----------
-        total_students_sql = "SELECT rfid FROM Students WHERE campusid = %s"
-        student_rfids = [s['rfid'] for s in db.fetch_all(total_students_sql, (campus_id,))]
-
-        present_students_sql = """
-            SELECT rfid FROM General_Attendance
-            WHERE DATE(date) = %s AND status = 'Present' AND rfid IN (
-                SELECT rfid FROM Students WHERE campusid = %s
-            )
-        """
-        on_leave_students_sql = """
-            SELECT rfid FROM General_Attendance
-            WHERE DATE(date) = %s AND status = 'Leave' AND rfid IN (
-                SELECT rfid FROM Students WHERE campusid = %s
-            )
-        """
-
-        present_students = {row['rfid'] for row in db.fetch_all(present_students_sql, (today, campus_id))}
-        on_leave_students = {row['rfid'] for row in db.fetch_all(on_leave_students_sql, (today, campus_id))}
-        total_students = len(student_rfids)
-
-        absent_students = [
-            rfid for rfid in student_rfids
-            if rfid not in present_students and rfid not in on_leave_students
-        ]
+        students = totals["students"]
+        total_students = students["total"]
+        present_students = students["present"]
+        on_leave_students = students["on_leave"]
+        absent_students = total_students - present_students - on_leave_students
 
         student_data = {
             "total_students": total_students,
-            "present_students": len(present_students),
-            "on_leave_students": len(on_leave_students),
-            "absent_students": len(absent_students),
-            "present_percentage": round((len(present_students) / total_students) * 100, 2) if total_students else 0,
-            "on_leave_percentage": round((len(on_leave_students) / total_students) * 100, 2) if total_students else 0,
-            "absent_percentage": round((len(absent_students) / total_students) * 100, 2) if total_students else 0
+            "present_students": present_students,
+            "on_leave_students": on_leave_students,
+            "absent_students": absent_students,
+            "present_percentage": round((present_students / total_students) * 100, 2) if total_students else 0,
+            "on_leave_percentage": round((on_leave_students / total_students) * 100, 2) if total_students else 0,
+            "absent_percentage": round((absent_students / total_students) * 100, 2) if total_students else 0
         }
 
         # ---------- TEACHER ATTENDANCE ----------
-        teacher_sql = """
-            SELECT e.RFID FROM employee e
-            WHERE e.CampusID = %s
-        """
-        teacher_rfids = [t['RFID'] for t in db.fetch_all(teacher_sql, (campus_id,))]
-
-        teacher_attendance_sql = """
-            SELECT RFID, Attendance_status FROM Employee_Attendance
-            WHERE Attendance_date = %s AND RFID IN (
-                SELECT RFID FROM employee WHERE CampusID = %s
-            )
-        """
-        attendance_records = db.fetch_all(teacher_attendance_sql, (today, campus_id))
-
-        present_teachers = sum(1 for t in attendance_records if t["Attendance_status"] == "Present")
-        on_leave_teachers = sum(1 for t in attendance_records if t["Attendance_status"] == "Leave")
-        absent_teachers = sum(1 for t in attendance_records if t["Attendance_status"] == "Absent")
-        total_teachers = len(teacher_rfids)
+        teachers = totals["teachers"]
+        total_teachers = teachers["total"]
+        present_teachers = teachers["present"]
+        on_leave_teachers = teachers["on_leave"]
+        absent_teachers = teachers["absent"]
 
         teacher_data = {
             "total_teachers": total_teachers,
@@ -108,32 +91,31 @@ def get_unmarked_attendees():
     year = request.args.get('year', type=int)
     if campus_id is None or year is None:
         return jsonify({"success": False, "error": "Missing campus_id or year"}), 400
+    day = request.args.get('date')
     try:
-        today = date.today().strftime('%Y-%m-%d')
-        if year == 0:
-            unmarked_students_sql = """
-                SELECT s.rfid, s.student_name 
-                FROM Students s
-                WHERE s.campusid = %s 
-                AND s.year IN (1, 2) 
-                AND s.rfid NOT IN (
-                    SELECT DISTINCT ga.rfid FROM General_Attendance ga 
-                    WHERE DATE(ga.date) = %s
-                )
-            """
-            params = (campus_id, today)
-        else:
-            unmarked_students_sql = """
-                SELECT s.rfid, s.student_name 
-                FROM Students s
-                WHERE s.campusid = %s 
-                AND s.year = %s
-                AND s.rfid NOT IN (
-                    SELECT DISTINCT ga.rfid FROM General_Attendance ga 
-                    WHERE DATE(ga.date) = %s
-                )
-            """
-            params = (campus_id, year, today)
+        day = date.fromisoformat(day) if day else date.today()
+        if day == date.today() and request.args.get('live', '').lower() not in ('1', 'true'):
+            try:
+                return jsonify({
+                    "success": True,
+                    "unmarked_students": roster_index.unmarked(campus_id, year, day)
+                }), 200
+            except Exception as e:
+                print("🔥 Roster index error, falling back to SQL:", e)
+
+        years = ALL_YEARS if year == 0 else (year,)
+        placeholders = ','.join(['%s'] * len(years))
+        unmarked_students_sql = f"""
+            SELECT s.rfid, s.student_name 
+            FROM Students s
+            LEFT JOIN General_Attendance ga
+                ON ga.rfid = s.rfid
+                AND ga.date >= %s AND ga.date < %s + INTERVAL 1 DAY
+            WHERE s.campusid = %s 
+            AND s.year IN ({placeholders})
+            AND ga.rfid IS NULL
+        """
+        params = (day, day, campus_id, *years)
         unmarked_students = db.fetch_all(unmarked_students_sql, params)
         return jsonify({
             "success": True,
@@ -143,6 +125,175 @@ def get_unmarked_attendees():
         return jsonify({"success": False, "error": str(e)}), 500
 
 
+def record_presence(day, scans):
+    """Mark ``scans`` — (rfid, time) pairs — present on ``day`` in one transaction.
+
+    RFIDs already marked that day are skipped, except that an Absent row
+    written by the day close is turned into Present. Returns ``(inserted,
+    skipped)`` lists of RFIDs; the upgraded ones count as inserted.
+    """
+    with db.transaction() as tx:
+        inserted, skipped = _record_presence(tx, day, scans)
+    roster_index.add_marked(day, inserted)
+    return inserted, skipped
+
+
+def _record_presence(tx, day, scans):
+    first_scans = {}
+    for rfid, at in scans:
+        if rfid:
+            first_scans.setdefault(str(rfid), (rfid, at))
+    scans = list(first_scans.values())
+    if not scans:
+        return [], []
+    rfids = [rfid for rfid, _ in scans]
+
+    placeholders = ','.join(['%s'] * len(rfids))
+    # Another worker, gate flush or sync chunk may be marking the same students;
+    # lock their rows so only one of them inserts, and read the attendance with
+    # a locking read so it sees rows committed after this transaction began.
+    tx.fetch_all(f"SELECT RFID FROM Students WHERE RFID IN ({placeholders}) FOR UPDATE", tuple(rfids))
+    check_attendance_sql = f"""
+        SELECT RFID, Status FROM General_Attendance 
+        WHERE date = %s AND RFID IN ({placeholders})
+        FOR UPDATE
+    """
+    statuses = defaultdict(set)
+    for row in tx.fetch_all(check_attendance_sql, (day, *rfids)):
+        statuses[str(row['RFID'])].add(row['Status'])
+    new_scans = [(rfid, at) for rfid, at in scans if str(rfid) not in statuses]
+    # Only finalise_day() writes Absent, so these students turned up after the day was closed.
+    late_scans = [(rfid, at) for rfid, at in scans if statuses.get(str(rfid)) == {"Absent"}]
+    skipped = [rfid for rfid in rfids if str(rfid) in statuses and statuses[str(rfid)] != {"Absent"}]
+
+    if late_scans:
+        tx.execute_many("""
+            UPDATE General_Attendance SET Status = 'Present', time = %s
+            WHERE date = %s AND RFID = %s AND Status = 'Absent'
+        """, [(at, day, rfid) for rfid, at in late_scans])
+        placeholders = ','.join(['%s'] * len(late_scans))
+        # The day close already added the day to TotalDays.
+        tx.execute(f"""
+            UPDATE Students 
+            SET DaysAttended = DaysAttended + 1 
+            WHERE RFID IN ({placeholders})
+        """, tuple(rfid for rfid, _ in late_scans))
+        late_rfids = [rfid for rfid, _ in late_scans]
+        bump_students(tx, day, late_rfids, "Absent", -1)
+        bump_students(tx, day, late_rfids)
+        record_statuses(tx, day, {rfid: "Present" for rfid in late_rfids})
+
+    if new_scans:
+        # The connector folds an executemany INSERT into multi-row statements.
+        insert_attendance_sql = """
+            INSERT INTO General_Attendance (date, RFID, Status, time) 
+            VALUES (%s, %s, %s, %s)
+        """
+        tx.execute_many(insert_attendance_sql, [
+            (day, rfid, "Present", at) for rfid, at in new_scans
+        ])
+
+        placeholders = ','.join(['%s'] * len(new_scans))
+        update_students_sql = f"""
+            UPDATE Students 
+            SET DaysAttended = DaysAttended + 1, 
+                TotalDays = TotalDays + 1 
+            WHERE RFID IN ({placeholders})
+        """
+        tx.execute(update_students_sql, tuple(rfid for rfid, _ in new_scans))
+        bump_students(tx, day, [rfid for rfid, _ in new_scans])
+        record_statuses(tx, day, {rfid: "Present" for rfid, _ in new_scans})
+
+    return [rfid for rfid, _ in new_scans + late_scans], skipped
+
+
+GATE_SYNC_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS Gate_Sync_Events (
+        event_key VARCHAR(128) NOT NULL PRIMARY KEY,
+        device_id VARCHAR(64),
+        RFID VARCHAR(64) NOT NULL,
+        scanned_at DATETIME NOT NULL,
+        synced_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        KEY idx_gate_sync_synced_at (synced_at)
+    )
+"""
+
+
+def _sync_chunk(number, events):
+    """Apply one chunk of offline scans; replayed idempotency keys are no-ops."""
+    ack = {"chunk": number, "received": len(events), "applied": 0,
+           "replayed": 0, "skipped": 0, "invalid": 0}
+    pending = {}
+    for event in events:
+        try:
+            rfid = event.get("rfid")
+            # Buffered scans must say when they happened; "now" would file them under the sync time.
+            if event.get("scanned_at") in (None, ""):
+                raise ValueError("missing scanned_at")
+            scanned_at = scan_time(event["scanned_at"])
+        except (AttributeError, TypeError, ValueError, OverflowError, OSError):
+            rfid = None
+        if not valid_rfid(rfid):
+            ack["invalid"] += 1
+            continue
+        key = event_key(event)
+        if key in pending:
+            ack["replayed"] += 1
+            continue
+        pending[key] = (event.get("device_id"), rfid, scanned_at)
+        ack["last_key"] = key
+    if not pending:
+        return ack
+
+    with db.transaction() as tx:
+        placeholders = ','.join(['%s'] * len(pending))
+        synced_sql = f"SELECT event_key FROM Gate_Sync_Events WHERE event_key IN ({placeholders})"
+        synced = {row['event_key'] for row in tx.fetch_all(synced_sql, tuple(pending))}
+        new_events = [(key, *event) for key, event in pending.items() if key not in synced]
+        if new_events:
+            new_events = _claim_sync_events(tx, new_events)
+        ack["replayed"] += len(pending) - len(new_events)
+        if not new_events:
+            return ack
+
+        by_day = defaultdict(list)
+        for _, _, rfid, scanned_at in new_events:
+            by_day[scanned_at.date()].append((rfid, scanned_at.time()))
+        applied = {}
+        for day, scans in sorted(by_day.items()):
+            inserted, skipped = _record_presence(tx, day, scans)
+            applied[day] = inserted
+            ack["applied"] += len(inserted)
+            ack["skipped"] += len(skipped)
+    for day, inserted in applied.items():
+        roster_index.add_marked(day, inserted)
+    return ack
+
+
+def _claim_sync_events(tx, new_events):
+    """INSERT IGNORE the events' keys; returns the events this request inserted.
+
+    A retry racing the original upload finds some keys already taken (its
+    INSERT IGNORE waits for the other transaction, then skips them). The
+    batch is then undone and redone row by row to learn which keys are ours.
+    """
+    columns = ('event_key', 'device_id', 'RFID', 'scanned_at')
+    tx.execute("SAVEPOINT gate_sync_claim")
+    if tx.upsert('Gate_Sync_Events', columns, new_events, update_columns=()) == len(new_events):
+        return new_events
+    tx.execute("ROLLBACK TO SAVEPOINT gate_sync_claim")
+    claimed = []
+    for event in new_events:
+        tx.execute("INSERT IGNORE INTO Gate_Sync_Events (event_key, device_id, RFID, scanned_at) "
+                   "VALUES (%s, %s, %s, %s)", event, prepared=True)
+        if tx.rowcount > 0:
+            claimed.append(event)
+    return claimed
+
+
+gate_ingestor = ScanIngestor(record_presence)
+
+
 @attendance_bp.route('/mark_present', methods=['POST'])
 def mark_present():
     try:
@@ -153,35 +304,64 @@ def mark_present():
 
         today_date = date.today().strftime('%Y-%m-%d')
         current_time = datetime.now().strftime('%H:%M:%S')
-        db_instance = Database()
-        for student in students:
-            rfid = student.get("rfid") if isinstance(student, dict) else student
-            if not rfid:
-                continue
-            check_attendance_sql = """
-                SELECT COUNT(*) FROM General_Attendance 
-                WHERE date = %s AND RFID = %s
-            """
-            result = db_instance.fetch_one(check_attendance_sql, (today_date, rfid))
-            if result and result['COUNT(*)'] > 0:
-                continue
-            update_students_sql = """
-                UPDATE Students 
-                SET DaysAttended = DaysAttended + 1, 
-                    TotalDays = TotalDays + 1 
-                WHERE RFID = %s
-            """
-            db_instance.execute_query(update_students_sql, (rfid,))
-            insert_attendance_sql = """
-                INSERT INTO General_Attendance (date, RFID, Status, time) 
-                VALUES (%s, %s, %s, %s)
-            """
-            db_instance.execute_query(insert_attendance_sql, (today_date, rfid, "Present", current_time))
-        return jsonify({"success": True, "message": "Attendance recorded successfully!"})
+        rfids = [student.get("rfid") if isinstance(student, dict) else student for student in students]
+        inserted, skipped = record_presence(today_date, [(rfid, current_time) for rfid in rfids])
+
+        return jsonify({
+            "success": True,
+            "message": "Attendance recorded successfully!",
+            "inserted": inserted,
+            "skipped": skipped,
+        })
 
     except Exception as e:
         return jsonify({"success": False, "message": str(e)}), 500
 
+
+@attendance_bp.route('/gate/scans', methods=['POST'])
+def ingest_gate_scans():
+    """Accept a batch of gate reader taps; they are written asynchronously."""
+    try:
+        scans = parse_scans(request.get_data(), request.content_type or "")
+    except ValueError as e:
+        return jsonify({"success": False, "message": f"Invalid scan payload: {e}"}), 400
+    if not isinstance(scans, list):
+        return jsonify({"success": False, "message": "Expected a list of scans"}), 400
+
+    result = gate_ingestor.submit(scans)
+    if result["dropped"]:
+        # Resending the whole batch is safe: accepted scans come back as duplicates.
+        response = jsonify({"success": False, "message": "Ingest queue full, retry shortly", **result})
+        response.headers["Retry-After"] = "1"
+        return response, 503
+    return jsonify({"success": True, **result}), 202
+
+
+@attendance_bp.route('/gate/sync', methods=['POST'])
+def sync_gate_scans():
+    """Replay a gate device's offline buffer, streamed as NDJSON.
+
+    Each line is ``{"key", "rfid", "device_id", "scanned_at"}``; ``key`` is
+    the event's idempotency key, so re-sending after a timeout only costs one
+    key lookup per chunk. Returns one ack per SYNC_CHUNK_SIZE events.
+    """
+    if not db.ensure_schema(GATE_SYNC_SCHEMA):
+        return jsonify({"success": False, "message": "Sync storage unavailable"}), 500
+
+    acks = []
+    try:
+        for number, events in enumerate(iter_ndjson_chunks(request.stream)):
+            acks.append(_sync_chunk(number, events))
+    except Exception as e:
+        # Committed chunks stay applied; the device can resend everything.
+        return jsonify({"success": False, "message": str(e), "acks": acks}), 500
+    return jsonify({"success": True, "acks": acks})
+
+
+@attendance_bp.route('/gate/stats', methods=['GET'])
+def gate_ingest_stats():
+    return jsonify(gate_ingestor.stats())
+
 @attendance_bp.route('/get_attendance_data_view_attendance', methods=['GET'])
 def get_attendance_data_view_attendance():
     campus_id = request.args.get('campus_id', type=int)
@@ -283,6 +463,31 @@ def get_attendance_edit():
         return jsonify({"success": False, "error": str(e)}), 500
 
 
+@attendance_bp.route("/student/attendance_bitmap", methods=["GET"])
+def attendance_bitmap_summary():
+    """Year totals, monthly counts and streaks from the student's attendance bitmap."""
+    rfid = request.args.get("rfid")
+    if not rfid:
+        return jsonify({"error": "rfid is required"}), 400
+    year = request.args.get("academic_year", type=int, default=academic_year(date.today()))
+    subject_id = request.args.get("subject_id", type=int, default=0)
+
+    try:
+        bits = load_bitmap(rfid, year, subject_id)
+        current_streak, longest_streak = bits.streaks()
+        return jsonify({
+            "rfid": rfid,
+            "academic_year": year,
+            "subject_id": subject_id,
+            **bits.count(),
+            "monthly": bits.monthly(),
+            "current_streak": current_streak,
+            "longest_streak": longest_streak,
+        })
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
 #Student Dashboard
 @attendance_bp.route("/student/attendance_summary", methods=["POST"])
 def attendance_summary():
@@ -292,69 +497,80 @@ def attendance_summary():
         if not rfid:
             return jsonify({"error": "rfid is required"}), 400
 
-        # Query subject-level attendance data
-        subject_query = """
-            SELECT s.subject_name, sa.attendance_status, sa.date, se.TotalDays, se.SubjectAttended
+        window_sql, window_params = "", ()
+        if data.get("academic_year"):
+            year = int(data["academic_year"])
+            window_sql = " AND {column} >= %s AND {column} < %s"
+            window_params = (year_start(year), year_start(year + 1))
+        recent_limit = int(data.get("recent_absences", RECENT_ABSENCES_LIMIT))
+
+        # Subject-level counts, grouped in MySQL
+        subject_query = f"""
+            SELECT sa.subject_id, s.subject_name,
+                   SUM(CASE WHEN sa.attendance_status = 'present' THEN 1 ELSE 0 END) AS present,
+                   SUM(CASE WHEN sa.attendance_status = 'absent' THEN 1 ELSE 0 END) AS absent,
+                   COUNT(*) AS total_classes
             FROM Subject_Attendance sa
             JOIN Subjects s ON sa.subject_id = s.subject_id
             JOIN Subjects_Enrolled se ON sa.subject_id = se.subject_id AND sa.RFID = se.RFID
-            WHERE sa.RFID = %s
+            WHERE sa.RFID = %s{window_sql.format(column="sa.date")}
+            GROUP BY sa.subject_id, s.subject_name
         """
-        subject_attendance = db.fetch_all(subject_query, (rfid,))
-
-        subject_data = defaultdict(lambda: {
-            "name": "",
-            "present": 0,
-            "absent": 0,
-            "total_classes": 0,
-            "recent_absences": []
-        })
-
-        for row in subject_attendance:
-            subject = row["subject_name"]
-            status = row["attendance_status"]
-            date = row["date"]
-
-            subject_info = subject_data[subject]
-            subject_info["name"] = subject
-            subject_info["total_classes"] += 1
-
-            if status == "present":
-                subject_info["present"] += 1
-            elif status == "absent":
-                subject_info["absent"] += 1
-                if date:
-                    subject_info["recent_absences"].append(date.strftime("%Y-%m-%d"))
-
-        for info in subject_data.values():
-            total = info["total_classes"] or 1
-            info["percentage"] = round((info["present"] / total) * 100)
-
-        # Query general attendance
-        general_query = """
-            SELECT Status, date
+        subject_rows = db.fetch_all(subject_query, (rfid, *window_params))
+
+        # Only the latest few absence dates per subject
+        recent_absences_query = f"""
+            SELECT subject_id, date FROM (
+                SELECT sa.subject_id, sa.date,
+                       ROW_NUMBER() OVER (PARTITION BY sa.subject_id ORDER BY sa.date DESC) AS recency
+                FROM Subject_Attendance sa
+                JOIN Subjects_Enrolled se ON sa.subject_id = se.subject_id AND sa.RFID = se.RFID
+                WHERE sa.RFID = %s AND sa.attendance_status = 'absent'
+                  AND sa.date IS NOT NULL{window_sql.format(column="sa.date")}
+            ) ranked
+            WHERE recency <= %s
+            ORDER BY subject_id, date DESC
+        """
+        recent_absences = defaultdict(list)
+        for row in db.fetch_all(recent_absences_query, (rfid, *window_params, recent_limit)):
+            recent_absences[row["subject_id"]].append(row["date"].strftime("%Y-%m-%d"))
+
+        subjects = []
+        for row in subject_rows:
+            present, total = int(row["present"] or 0), row["total_classes"]
+            subjects.append({
+                "name": row["subject_name"],
+                "present": present,
+                "absent": int(row["absent"] or 0),
+                "total_classes": total,
+                "recent_absences": recent_absences.get(row["subject_id"], []),
+                "percentage": round((present / (total or 1)) * 100),
+            })
+
+        # General attendance, grouped by month in MySQL
+        general_query = f"""
+            SELECT YEAR(date) AS year, MONTH(date) AS month_number, MONTHNAME(date) AS month,
+                   SUM(CASE WHEN Status = 'Present' THEN 1 ELSE 0 END) AS present,
+                   SUM(CASE WHEN Status = 'Absent' THEN 1 ELSE 0 END) AS absent,
+                   COUNT(*) AS total
             FROM General_Attendance
-            WHERE RFID = %s
+            WHERE RFID = %s{window_sql.format(column="date")}
+            GROUP BY YEAR(date), MONTH(date), MONTHNAME(date)
+            ORDER BY year, month_number
         """
-        general_attendance = db.fetch_all(general_query, (rfid,))
+        general_rows = db.fetch_all(general_query, (rfid, *window_params))
 
-        total_present = sum(1 for row in general_attendance if row["Status"] == "Present")
-        total_absent = sum(1 for row in general_attendance if row["Status"] == "Absent")
-        total_classes = len(general_attendance)
+        total_present = sum(int(row["present"] or 0) for row in general_rows)
+        total_absent = sum(int(row["absent"] or 0) for row in general_rows)
+        total_classes = sum(row["total"] for row in general_rows)
         overall_attendance = round((total_present / total_classes) * 100) if total_classes else 0
 
-        # Monthly summary
-        monthly_summary = defaultdict(lambda: {"present": 0, "absent": 0})
-        for row in general_attendance:
-            if not row["date"]:
-                continue
-            month = row["date"].strftime("%B")
-            if row["Status"] == "Present":
-                monthly_summary[month]["present"] += 1
-            elif row["Status"] == "Absent":
-                monthly_summary[month]["absent"] += 1
-
-        print(subject_data)
+        # Monthly summary; rows without a date only count towards the totals
+        monthly_summary = [
+            {"month": row["month"], "year": row["year"],
+             "present": int(row["present"] or 0), "absent": int(row["absent"] or 0)}
+            for row in general_rows if row["month"]
+        ]
 
         return jsonify({
             "status": "success",
@@ -362,11 +578,8 @@ def attendance_summary():
             "total_present": total_present,
             "total_absent": total_absent,
             "total_classes": total_classes,
-            "monthly_summary": [
-                {"month": month, **counts}
-                for month, counts in monthly_summary.items()
-            ],
-            "subjects": list(subject_data.values())
+            "monthly_summary": monthly_summary,
+            "subjects": subjects
         })
 
     except Exception as e:
@@ -384,13 +597,7 @@ def generate_attendance_excel():
         return jsonify({"success": False, "error": "Missing campus_id"}), 400
 
     try:
-        file_path = _write_attendance_excel(campus_id, year)
-        filename  = os.path.basename(file_path)
-        return send_from_directory(
-            GENERATED_FOLDER, filename, as_attachment=True,
-            download_name=filename,
-            mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-        )
+        return _send_report("attendance", campus_id, year)
     except ValueError as e:   # raised when no students
         return jsonify({"success": False, "error": str(e)}), 404
     except Exception as e:
@@ -400,8 +607,11 @@ def generate_attendance_excel():
 
 
 # ─── 2.  HELPER  (takes campus_id & year) ─────────────────────────────────────
-def _write_attendance_excel(campus_id: int, year: int = 0) -> str:
-    """Return the full path of the generated file."""
+ATTENDANCE_HEADER = ["Student Name", "RFID", "Total Days", "Days Attended", "Percentage", "Warning"]
+
+
+def _attendance_rows(campus_id: int, year: int = 0):
+    """Sheet rows straight from the database, one student at a time."""
     sql = """
         SELECT student_name, RFID, TotalDays, DaysAttended
         FROM Students
@@ -412,31 +622,24 @@ def _write_attendance_excel(campus_id: int, year: int = 0) -> str:
         sql += " AND year = %s"
         params.append(year)
 
-    rows = db.fetch_all(sql, tuple(params))
-    if not rows:
-        raise ValueError("No students found")
+    for row in db.iter_rows(sql, tuple(params)):
+        total_days = int(row["TotalDays"] or 0)
+        attended   = int(row["DaysAttended"] or 0)
+        percentage = round(attended / total_days * 100, 2) if total_days > 0 else 0.0
+        yield (row["student_name"], row["RFID"], total_days, attended, percentage,
+               "W" if percentage < 70 else "")
 
-    df = pd.DataFrame(rows).fillna(0)
-    df["TotalDays"]    = df["TotalDays"].astype(int)
-    df["DaysAttended"] = df["DaysAttended"].astype(int)
-    df["Percentage"]   = df.apply(
-        lambda r: round((r.DaysAttended / r.TotalDays) * 100, 2)
-        if r.TotalDays else 0, axis=1
-    )
-    df["Warning"] = df["Percentage"].apply(lambda p: "W" if p < 70 else "")
-
-    df = df.rename(columns={
-        "student_name": "Student Name",
-        "RFID":         "RFID",
-        "TotalDays":    "Total Days",
-        "DaysAttended": "Days Attended"
-    })[["Student Name","RFID","Total Days","Days Attended","Percentage","Warning"]]
-
-    ts       = datetime.now().strftime("%Y%m%d_%H%M%S")
-    suffix   = f"_year_{year}" if year else "_all_years"
-    filename = f"attendance_report_campus_{campus_id}{suffix}_{ts}.xlsx"
-    file_path = os.path.join(GENERATED_FOLDER, filename)
-    df.to_excel(file_path, index=False)
+
+def _write_attendance_excel(campus_id: int, year: int = 0, file_path: str = None) -> str:
+    """Return the full path of the generated file (``file_path`` or a new timestamped one)."""
+    rows = _report_rows("attendance", campus_id, year)
+
+    if file_path is None:
+        ts       = datetime.now().strftime("%Y%m%d_%H%M%S")
+        suffix   = f"_year_{year}" if year else "_all_years"
+        filename = f"attendance_report_campus_{campus_id}{suffix}_{ts}.xlsx"
+        file_path = os.path.join(GENERATED_FOLDER, filename)
+    write_table(file_path, ATTENDANCE_HEADER, rows)
     return file_path
 # ──────────────────────────────────────────────────────────────────────────────
 
@@ -464,13 +667,7 @@ def generate_fine_excel():
         return jsonify({"success": False, "error": "Missing campus_id"}), 400
 
     try:
-        file_path = _write_fine_excel(campus_id, year)
-        filename  = os.path.basename(file_path)
-        return send_from_directory(
-            GENERATED_FOLDER, filename, as_attachment=True,
-            download_name=filename,
-            mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        )
+        return _send_report("fine", campus_id, year)
     except ValueError as e:        # raised when nobody owes a fine
         return jsonify({"success": False, "error": str(e)}), 404
     except Exception as e:
@@ -479,10 +676,11 @@ def generate_fine_excel():
 
 
 # ─── 2.  HELPER  (campus_id & year) ───────────────────────────────────────────
-def _write_fine_excel(campus_id: int, year: int = 0) -> str:
-    """
-    Return the absolute path of the generated fine‑report .xlsx file.
-    """
+FINE_HEADER = ["Student Name", "RFID", "Fine"]
+
+
+def _fine_rows(campus_id: int, year: int = 0):
+    """Sheet rows straight from the database, one student at a time."""
     sql = """
         SELECT student_name, RFID, Fine
         FROM Students
@@ -494,27 +692,158 @@ def _write_fine_excel(campus_id: int, year: int = 0) -> str:
         sql += " AND year = %s"
         params.append(year)
 
-    rows = db.fetch_all(sql, tuple(params))
-    if not rows:
-        raise ValueError("No students with outstanding fines found")
-
-    df = (
-        pd.DataFrame(rows)
-        .fillna({"Fine": 0})
-        .rename(columns={
-            "student_name": "Student Name",
-            "RFID":         "RFID",
-            "Fine":         "Fine",
-        })[["Student Name", "RFID", "Fine"]]
-    )
+    for row in db.iter_rows(sql, tuple(params)):
+        yield (row["student_name"], row["RFID"], row["Fine"] or 0)
 
-    ts       = datetime.now().strftime("%Y%m%d_%H%M%S")
-    yr_tag   = f"_year_{year}" if year else "_all_years"
-    filename = f"fine_report_campus_{campus_id}{yr_tag}_{ts}.xlsx"
-    file_path = os.path.join(GENERATED_FOLDER, filename)
-    df.to_excel(file_path, index=False)
+
+def _write_fine_excel(campus_id: int, year: int = 0, file_path: str = None) -> str:
+    """
+    Return the absolute path of the generated fine‑report .xlsx file
+    (``file_path`` or a new timestamped one).
+    """
+    rows = _report_rows("fine", campus_id, year)
+
+    if file_path is None:
+        ts       = datetime.now().strftime("%Y%m%d_%H%M%S")
+        yr_tag   = f"_year_{year}" if year else "_all_years"
+        filename = f"fine_report_campus_{campus_id}{yr_tag}_{ts}.xlsx"
+        file_path = os.path.join(GENERATED_FOLDER, filename)
+    write_table(file_path, FINE_HEADER, rows)
     return file_path
 
 
+# ─── 3.  REPORT CACHE  (one file per report, campus, year and data version) ───
+REPORT_WRITERS = {
+    "attendance": _write_attendance_excel,
+    "fine":       _write_fine_excel,
+}
+# report -> (header, row generator, error when it yields nothing)
+REPORT_TABLES = {
+    "attendance": (ATTENDANCE_HEADER, _attendance_rows, "No students found"),
+    "fine":       (FINE_HEADER, _fine_rows, "No students with outstanding fines found"),
+}
+# The Students columns (and extra filter) each report reads.
+REPORT_SOURCES = {
+    "attendance": (("student_name", "RFID", "TotalDays", "DaysAttended"), ""),
+    "fine":       (("student_name", "RFID", "Fine"), " AND t.Fine > 0"),
+}
+
+
+def _report_rows(kind, campus_id, year):
+    """The sheet's rows as a lazy iterator; raises ValueError when there are none."""
+    _, rows_for, empty_error = REPORT_TABLES[kind]
+    rows = peek(rows_for(campus_id, year))
+    if rows is None:
+        raise ValueError(empty_error)
+    return rows
+
+
+def _report_probes(kind, campus_id, year):
+    columns, extra = REPORT_SOURCES[kind]
+    where, params = "t.campusid = %s" + extra, [campus_id]
+    if year:
+        where += " AND t.year = %s"
+        params.append(year)
+    return [row_probe("Students", columns, where, params)]
+
+
+def _cached_report(kind, campus_id, year):
+    """``(path, etag)`` of the sheet, rebuilt only when its Students rows changed."""
+    write = REPORT_WRITERS[kind]
+    return report_cache.fetch(
+        kind, {"campus_id": campus_id, "year": year}, _report_probes(kind, campus_id, year),
+        lambda file_path: write(campus_id, year, file_path))
+
+
+def _send_report(kind, campus_id, year):
+    """
+    Serve the sheet from the report cache; on a miss, stream it to the client
+    while it is being written (saving a copy into the cache as it goes).
+    """
+    cache_path, etag = report_cache.lookup(
+        kind, {"campus_id": campus_id, "year": year}, _report_probes(kind, campus_id, year))
+    suffix = f"_year_{year}" if year else "_all_years"
+    download_name = f"{kind}_report_campus_{campus_id}{suffix}.xlsx"
+
+    if etag and request.if_none_match.contains(etag):
+        return "", 304, {"ETag": quote_etag(etag)}
+    if etag and report_cache.has(cache_path):
+        return send_file(cache_path, as_attachment=True, download_name=download_name,
+                         mimetype=XLSX_MIMETYPE, etag=etag, conditional=True)
+
+    header = REPORT_TABLES[kind][0]
+    rows   = _report_rows(kind, campus_id, year)   # ValueError → 404 before any byte is sent
+    headers = {"Content-Disposition": f"attachment; filename={download_name}"}
+    if etag:
+        headers["ETag"] = quote_etag(etag)
+    return Response(
+        stream_workbook(lambda out: write_table(out, header, rows),
+                        save_as=cache_path, store=report_store),
+        mimetype=XLSX_MIMETYPE, headers=headers,
+    )
+# ──────────────────────────────────────────────────────────────────────────────
+
+
+# ─── 4.  BACKGROUND JOBS  (either report, built off the request) ──────────────
+
+
+@attendance_bp.route("/report_jobs", methods=["POST"])
+def submit_attendance_report_job():
+    """
+    Queue an attendance or fine sheet and return its job id at once (202).
+
+    Body: {"report": "attendance" | "fine", "campus_id": int, "year": int (optional)}
+    Poll GET /report_jobs/<job_id>, then fetch GET /report_jobs/<job_id>/download.
+    """
+    data      = request.get_json(force=True) or {}
+    kind      = data.get("report")
+    campus_id = data.get("campus_id")
+    year      = int(data.get("year") or 0)
+    if kind not in REPORT_WRITERS:
+        return jsonify({"success": False, "error": "report must be 'attendance' or 'fine'"}), 400
+    if campus_id is None:
+        return jsonify({"success": False, "error": "Missing campus_id"}), 400
+
+    suffix = f"_year_{year}" if year else "_all_years"
+    try:
+        job = report_jobs.submit(
+            kind, campus_id, {"year": year},
+            lambda output_file, progress: _cached_report(kind, int(campus_id), year)[0],
+            f"{kind}_report_campus_{campus_id}{suffix}.xlsx")
+    except QueueFull as e:
+        return jsonify({"success": False, "error": str(e)}), 503, {"Retry-After": "30"}
+    return submit_response(job, url_for(".attendance_report_job_status", job_id=job.id))
+
+
+@attendance_bp.route("/report_jobs/<job_id>", methods=["GET"])
+def attendance_report_job_status(job_id):
+    return job_status(job_id, url_for(".download_attendance_report_job", job_id=job_id))
+
+
+@attendance_bp.route("/report_jobs/<job_id>/download", methods=["GET"])
+def download_attendance_report_job(job_id):
+    job = report_jobs.get(job_id)
+    if job is None or job.status != "done":
+        return jsonify({"success": False, "error": "Report is not ready"}), 404 if job is None else 409
+    if not os.path.exists(job.file_path):
+        return jsonify({"success": False, "error": "Report was removed from disk; submit it again"}), 410
+    report_store.touch(job.file_path)
+    return send_from_directory(
+        os.path.dirname(job.file_path), os.path.basename(job.file_path), as_attachment=True,
+        download_name=job.download_name, mimetype=XLSX_MIMETYPE,
+    )
+# ──────────────────────────────────────────────────────────────────────────────
+
+
+@attendance_bp.route("/report_stats", methods=["GET"])
+def report_stats():
+    """Report jobs, cache hits and generated_reports disk usage for this process."""
+    return jsonify({
+        "jobs":  report_jobs.stats(),
+        "cache": report_cache.stats(),
+        "store": report_store.stats(),
+    })
+
+
 
 __all__ = ['attendance_bp']
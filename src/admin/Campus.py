@@ -8,7 +8,7 @@ db = Database()
 def get_campuses():
     try:
         query = "SELECT CampusID, CampusName FROM Campus"  # ✅ Fetch CampusID as well
-        result = db.fetch_all(query)
+        result = db.fetch_all(query, cache_ttl=300)
 
         print("Query Result:", result)  # 🔥 Debugging print
 
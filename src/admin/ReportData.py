@@ -0,0 +1,125 @@
+import pandas as pd
+
+from src.DatabaseConnection import Database
+from src.ReportCache import row_probe
+
+db = Database()
+
+MARKS_DTYPES = {"Marks_Acheived": "float64", "total_marks": "float64"}
+
+
+class ReportData:
+    """Everything a marks report needs for one scope, loaded in five queries.
+
+    The scope is a campus and year, or a single subject (``subject_id``);
+    marks are limited to students of ``campusid``. ``assessment_types``
+    narrows the assessments loaded. Frames are indexed so the sheet writers
+    can look up one assessment's marks or one monthly's quizzes in memory.
+    """
+
+    def __init__(self, campusid, year=None, subject_id=None, assessment_types=None):
+        if subject_id is not None:
+            scope_sql, scope_params = "subject_id = %s", (subject_id,)
+        else:
+            scope_sql, scope_params = "CampusID = %s AND year = %s", (campusid, year)
+        self.campusid = campusid
+
+        type_sql, type_params = "", ()
+        if assessment_types:
+            type_sql = f" AND A.assessment_type IN ({','.join(['%s'] * len(assessment_types))})"
+            type_params = tuple(assessment_types)
+        scoped_subjects = f"SELECT subject_id FROM Subjects WHERE {scope_sql}"
+
+        self.subjects = _frame(f"""
+            SELECT subject_id, subject_name FROM Subjects WHERE {scope_sql}
+        """, scope_params).set_index("subject_id", drop=False)
+
+        self.assessments = _frame(f"""
+            SELECT A.assessment_id, A.subject_id, A.assessment_type, A.total_marks, A.created_at
+            FROM Assessments A
+            WHERE A.subject_id IN ({scoped_subjects}){type_sql}
+            ORDER BY A.created_at ASC
+        """, scope_params + type_params)
+
+        marks = _frame(f"""
+            SELECT AM.assessment_id, S.student_name, S.RFID, AM.Marks_Acheived, AM.total_marks
+            FROM assessments_marks AM
+            JOIN Assessments A ON A.assessment_id = AM.assessment_id
+            JOIN Students S ON S.RFID = AM.rfid
+            WHERE A.subject_id IN ({scoped_subjects}){type_sql} AND S.campusid = %s
+        """, scope_params + type_params + (campusid,), dtypes=MARKS_DTYPES)
+        self._marks = {key: group.reset_index(drop=True) for key, group in marks.groupby("assessment_id", sort=False)}
+        self._empty_marks = marks.iloc[0:0]
+
+        self.quizzes = _frame(f"""
+            SELECT quiz_id, monthly_assessment_id, subject_id, quiz_number, total_marks
+            FROM quizzes
+            WHERE subject_id IN ({scoped_subjects})
+            ORDER BY quiz_number ASC
+        """, scope_params)
+
+        quiz_marks = _frame(f"""
+            SELECT QM.quiz_id, QM.rfid, QM.marks_achieved
+            FROM quiz_marks QM
+            JOIN quizzes Q ON Q.quiz_id = QM.quiz_id
+            WHERE Q.subject_id IN ({scoped_subjects})
+        """, scope_params, dtypes={"marks_achieved": "float64"})
+        # One mark per (student, quiz), keyed the same way however RFIDs are typed.
+        quiz_marks["rfid"] = quiz_marks["rfid"].astype(str)
+        self.quiz_marks = quiz_marks.drop_duplicates(["rfid", "quiz_id"], keep="last") \
+            .set_index(["rfid", "quiz_id"])["marks_achieved"]
+
+    def assessments_of(self, subject_id, assessment_type):
+        """The subject's assessments of one type, oldest first."""
+        frame = self.assessments
+        return frame[_matches(frame["subject_id"], subject_id) & (frame["assessment_type"] == assessment_type)]
+
+    def marks_of(self, assessment_id):
+        """Campus students' marks for one assessment, in load order."""
+        return self._marks.get(assessment_id, self._empty_marks)
+
+    def quizzes_of(self, monthly_id, subject_id):
+        frame = self.quizzes
+        return frame[_matches(frame["monthly_assessment_id"], monthly_id) & _matches(frame["subject_id"], subject_id)]
+
+    def quiz_mark_columns(self, quiz_ids, rfids):
+        """A frame of quiz marks, one column per quiz, aligned to ``rfids``; missing marks are 0."""
+        keys = pd.Index(rfids).astype(str)
+        columns = {}
+        for quiz_id in quiz_ids:
+            index = pd.MultiIndex.from_arrays([keys, [quiz_id] * len(keys)])
+            columns[quiz_id] = self.quiz_marks.reindex(index).fillna(0).to_numpy()
+        return pd.DataFrame(columns, index=range(len(keys)))
+
+
+def data_version_probes(campusid, year=None, subject_id=None):
+    """Probes (see ReportCache) over every row ReportData() would load for this scope."""
+    if subject_id is not None:
+        scope_sql, scope_params = "subject_id = %s", (subject_id,)
+    else:
+        scope_sql, scope_params = "CampusID = %s AND year = %s", (campusid, year)
+    scoped_subjects = f"SELECT subject_id FROM Subjects WHERE {scope_sql}"
+    return [
+        row_probe("Subjects", ("subject_id", "subject_name"), f"t.{scope_sql}", scope_params),
+        row_probe("Assessments", ("assessment_id", "subject_id", "assessment_type", "total_marks", "created_at"),
+                  f"t.subject_id IN ({scoped_subjects})", scope_params),
+        row_probe("assessments_marks", ("assessment_id", "rfid", "Marks_Acheived", "total_marks"),
+                  f"t.assessment_id IN (SELECT assessment_id FROM Assessments WHERE subject_id IN ({scoped_subjects}))",
+                  scope_params),
+        row_probe("quizzes", ("quiz_id", "monthly_assessment_id", "subject_id", "quiz_number", "total_marks"),
+                  f"t.subject_id IN ({scoped_subjects})", scope_params),
+        row_probe("quiz_marks", ("quiz_id", "rfid", "marks_achieved"),
+                  f"t.quiz_id IN (SELECT quiz_id FROM quizzes WHERE subject_id IN ({scoped_subjects}))", scope_params),
+        row_probe("Students", ("RFID", "student_name"), "t.campusid = %s", (campusid,)),
+    ]
+
+
+def _matches(column, value):
+    # Request parameters may arrive as strings while ids load as integers.
+    return column.astype(str) == str(value)
+
+
+def _frame(query, params, dtypes=None):
+    # A failed query must fail the report: a workbook missing its rows would
+    # be cached under the current data version.
+    return db.fetch_frame(query, params, dtypes=dtypes, raise_errors=True)
@@ -1,9 +1,13 @@
-import tempfile
-from flask import Blueprint, request, jsonify, send_file
+from flask import Blueprint, current_app, request, jsonify, send_file, url_for
 import os
+import numpy as np
 import pandas as pd 
 import traceback
 from src.DatabaseConnection import Database
+from src.admin.ReportData import ReportData, data_version_probes
+from src.ReportCache import report_cache
+from src.ReportStore import report_store
+from src.ReportJobs import QueueFull, XLSX_MIMETYPE, job_status, report_jobs, submit_response
 
 report_download_bp = Blueprint('report_download', __name__)
 
@@ -55,14 +59,9 @@ def subject_report():
     subjectid = data["subjectid"]
     year      = data["year"]
 
-    # create the report in a temp file
-    tmp = tempfile.NamedTemporaryFile(suffix=".xlsx", delete=False)
-    tmp.close()
-    generate_subject_wise_report(campusid, subjectid, year,
-                                 output_file=tmp.name)
-    return send_file(tmp.name,
-                     as_attachment=True,
-                     download_name=f"subject_{subjectid}_report.xlsx")
+    return _send_cached_report(
+        "subject-report", {"campusid": campusid, "subjectid": subjectid, "year": year},
+        download_name=f"subject_{subjectid}_report.xlsx")
 # --------------------------------------------------------------------
 # 1.  /assessment-report      →  generate_assessment_excel
 # --------------------------------------------------------------------
@@ -74,15 +73,9 @@ def assessment_report():
     subjectid       = data["subjectid"]
     assessment_type = data["assessment_type"]
 
-    tmp = tempfile.NamedTemporaryFile(suffix=".xlsx", delete=False)
-    tmp.close()
-
-    generate_assessment_excel(
-        campusid, subjectid, assessment_type, output_file=tmp.name
-    )
-    return send_file(
-        tmp.name,
-        as_attachment=True,
+    return _send_cached_report(
+        "assessment-report",
+        {"campusid": campusid, "subjectid": subjectid, "assessment_type": assessment_type},
         download_name=f"assessment_{subjectid}_{assessment_type}.xlsx",
     )
 
@@ -98,15 +91,9 @@ def all_subjects_assessments():
     year            = data["year"]
     assessment_type = data["assessment_type"]
 
-    tmp = tempfile.NamedTemporaryFile(suffix=".xlsx", delete=False)
-    tmp.close()
-
-    generate_all_subjects_assessments_excel(
-        campusid, year, assessment_type, output_file=tmp.name
-    )
-    return send_file(
-        tmp.name,
-        as_attachment=True,
+    return _send_cached_report(
+        "all-subjects-assessments",
+        {"campusid": campusid, "year": year, "assessment_type": assessment_type},
         download_name=f"all_subjects_{campusid}_{year}_{assessment_type}.xlsx",
     )
 
@@ -121,31 +108,196 @@ def all_monthlies_with_quizzes():
     campusid = data["campusid"]
     year     = data["year"]
 
-    tmp = tempfile.NamedTemporaryFile(suffix=".xlsx", delete=False)
-    tmp.close()
-
-    generate_all_monthlies_with_quizzes_excel(
-        campusid, year, output_file=tmp.name
-    )
-    return send_file(
-        tmp.name,
-        as_attachment=True,
+    return _send_cached_report(
+        "all-monthlies-with-quizzes", {"campusid": campusid, "year": year},
         download_name=f"monthlies_quizzes_{campusid}_{year}.xlsx",
     )
 
 
+# --------------------------------------------------------------------
+# 4.  Background jobs: the same four reports, built off the request
+# --------------------------------------------------------------------
+# report -> (request fields, download name); fields are passed to _generate_report().
+REPORT_JOB_KINDS = {
+    "subject-report": (("campusid", "subjectid", "year"), "subject_{subjectid}_report.xlsx"),
+    "assessment-report": (("campusid", "subjectid", "assessment_type"),
+                          "assessment_{subjectid}_{assessment_type}.xlsx"),
+    "all-subjects-assessments": (("campusid", "year", "assessment_type"),
+                                 "all_subjects_{campusid}_{year}_{assessment_type}.xlsx"),
+    "all-monthlies-with-quizzes": (("campusid", "year"), "monthlies_quizzes_{campusid}_{year}.xlsx"),
+}
+
+
+def _generate_report(kind, params, output_file, progress):
+    if kind == "subject-report":
+        generate_subject_wise_report(params["campusid"], params["subjectid"], params["year"],
+                                     output_file=output_file, progress=progress)
+    elif kind == "assessment-report":
+        generate_assessment_excel(params["campusid"], params["subjectid"], params["assessment_type"],
+                                  output_file=output_file, progress=progress)
+    elif kind == "all-subjects-assessments":
+        generate_all_subjects_assessments_excel(params["campusid"], params["year"], params["assessment_type"],
+                                                output_file=output_file, progress=progress)
+    else:
+        generate_all_monthlies_with_quizzes_excel(params["campusid"], params["year"],
+                                                  output_file=output_file, progress=progress)
+
+
+def _cached_report(kind, params, progress=None):
+    """``(path, etag)`` of the report, rebuilt only when the data it reads changed."""
+    if kind in ("subject-report", "assessment-report"):
+        probes = data_version_probes(params["campusid"], subject_id=params["subjectid"])
+    else:
+        probes = data_version_probes(params["campusid"], year=params["year"])
+    return report_cache.fetch(kind, params, probes,
+                              lambda output_file: _generate_report(kind, params, output_file, progress))
+
+
+def _send_cached_report(kind, params, download_name):
+    file_path, etag = _cached_report(kind, params)
+    if file_path is None:
+        return jsonify({"success": False, "error": "No data found for this report"}), 404
+    # Without an etag the file was a one-off build outside the cache.
+    return send_file(file_path if etag else report_store.take(file_path), as_attachment=True,
+                     download_name=download_name, mimetype=XLSX_MIMETYPE, etag=etag or False,
+                     conditional=True)
+
+
+@report_download_bp.route("/jobs", methods=["POST"])
+def submit_report_job():
+    """
+    Queue one of the reports above and return its job id at once (202).
 
-def generate_assessment_excel(campusid, subject_id, assessment_type, output_file='assessment_report.xlsx'):
-    # Step 1: Fetch matching assessments
-    assessment_query = """
-        SELECT A.assessment_id, A.total_marks, A.created_at
-        FROM Assessments A
-        WHERE A.subject_id = %s AND A.assessment_type = %s
-        ORDER BY A.created_at ASC
+    Body: {"report": "<route name, e.g. subject-report>", ...that route's fields}.
+    Poll GET /jobs/<job_id>, then fetch GET /jobs/<job_id>/download.
     """
-    assessments = db.fetch_all(assessment_query, (subject_id, assessment_type))
+    data = request.get_json(force=True) or {}
+    kind = data.get("report")
+    if kind not in REPORT_JOB_KINDS:
+        return jsonify({"success": False, "error": f"report must be one of {sorted(REPORT_JOB_KINDS)}"}), 400
+    fields, download_name = REPORT_JOB_KINDS[kind]
+    missing = [field for field in fields if data.get(field) in (None, "")]
+    if missing:
+        return jsonify({"success": False, "error": f"Missing {', '.join(missing)}"}), 400
+
+    params = {field: data[field] for field in fields}
+    try:
+        job = report_jobs.submit(
+            kind, params["campusid"], params,
+            lambda output_file, progress: _cached_report(kind, params, progress)[0],
+            download_name.format(**params))
+    except QueueFull as e:
+        return jsonify({"success": False, "error": str(e)}), 503, {"Retry-After": "30"}
+    return submit_response(job, url_for(".report_job_status", job_id=job.id))
+
+
+@report_download_bp.route("/jobs/<job_id>", methods=["GET"])
+def report_job_status(job_id):
+    return job_status(job_id, url_for(".download_report_job", job_id=job_id))
+
+
+@report_download_bp.route("/jobs/<job_id>/download", methods=["GET"])
+def download_report_job(job_id):
+    job = report_jobs.get(job_id)
+    if job is None or job.status != "done":
+        return jsonify({"success": False, "error": "Report is not ready"}), 404 if job is None else 409
+    if not os.path.exists(job.file_path):
+        return jsonify({"success": False, "error": "Report was removed from disk; submit it again"}), 410
+    report_store.touch(job.file_path)
+    return send_file(job.file_path, as_attachment=True, download_name=job.download_name,
+                     mimetype=XLSX_MIMETYPE)
+
+
+@report_download_bp.route("/jobs/stats", methods=["GET"])
+def report_job_stats():
+    return jsonify({**report_jobs.stats(), "cache": report_cache.stats(), "store": report_store.stats()})
+
+
+GRADE_THRESHOLDS = [
+    (95, 'A++'), (90, 'A+'), (85, 'A'), (80, 'B++'), (75, 'B+'),
+    (70, 'B'), (60, 'C'), (50, 'D'), (40, 'U'),
+]
+
+
+def _report_progress(progress, done, total):
+    if progress is not None and total:
+        progress(done / total)
+
+
+def _grade_column(percentage):
+    """Vectorised letter grades for a Series of percentages."""
+    return np.select(
+        [percentage >= cutoff for cutoff, _ in GRADE_THRESHOLDS],
+        [grade for _, grade in GRADE_THRESHOLDS],
+        default='F',
+    )
+
+
+def _graded_marks_frame(marks, total):
+    """Build the Student/RFID/Marks/Total/Percentage/Grade block for one assessment."""
+    percentage = (marks['Marks_Acheived'] / total * 100).where(total > 0, 0)
+    return pd.DataFrame({
+        'Student Name': marks['student_name'],
+        'RFID': marks['RFID'],
+        'Marks Achieved': marks['Marks_Acheived'],
+        'Total Marks': total,
+        'Percentage': percentage.round(2),
+        'Grade': _grade_column(percentage),
+    })
 
-    if not assessments:
+
+def _number(value):
+    """Marks totals as floats, with missing values as 0."""
+    return 0 if pd.isna(value) else float(value)
+
+
+def _exam_date(created_at, fmt="%d-%b-%Y"):
+    return created_at.strftime(fmt) if pd.notna(created_at) else ""
+
+
+def _assessment_marks_frame(data, assessment):
+    """Graded marks for one assessment, falling back to the assessment's total."""
+    marks = data.marks_of(assessment['assessment_id'])
+    total = marks['total_marks'].where(marks['total_marks'] > 0, _number(assessment['total_marks']))
+    return _graded_marks_frame(marks, total)
+
+
+def _monthly_with_quizzes_frame(data, subject_id, monthly):
+    """One Monthly's marks with its quizzes pivoted alongside; None if nobody sat it."""
+    marks = data.marks_of(monthly['assessment_id'])
+    if marks.empty:
+        return None
+    # One row per student; a repeated RFID keeps its last mark.
+    marks = marks.drop_duplicates('RFID', keep='last').reset_index(drop=True)
+
+    quizzes = data.quizzes_of(monthly['assessment_id'], subject_id)
+    quiz_columns = data.quiz_mark_columns(quizzes['quiz_id'], marks['RFID'])
+    quiz_columns.columns = [f"Quiz {number}" for number in quizzes['quiz_number']]
+
+    monthly_total = _number(monthly['total_marks'])
+    monthly_obtained = marks['Marks_Acheived'].fillna(0)
+    avg_quiz = quiz_columns.mean(axis=1) if len(quizzes) else 0
+    total_obtained = monthly_obtained + avg_quiz
+    total_possible = monthly_total + (_number(quizzes['total_marks'].iloc[0]) if len(quizzes) else 0)
+    percentage = total_obtained / total_possible * 100 if total_possible > 0 else total_obtained * 0
+
+    df = pd.concat([marks[['student_name', 'RFID']].rename(columns={'student_name': 'Student Name'}),
+                    quiz_columns], axis=1)
+    df['Monthly Marks'] = monthly_obtained
+    df['Total Monthly Marks'] = monthly_total
+    df['Total Obtained'] = total_obtained.round(2)
+    df['Percentage'] = percentage.round(2)
+    df['Grade'] = _grade_column(percentage)
+    return df
+
+
+def generate_assessment_excel(campusid, subject_id, assessment_type, output_file='assessment_report.xlsx',
+                              progress=None):
+    # Step 1: Load matching assessments and their marks
+    data = ReportData(campusid, subject_id=subject_id, assessment_types=[assessment_type])
+    assessments = data.assessments_of(subject_id, assessment_type)
+
+    if assessments.empty:
         print(" No assessments found for given criteria.")
         return
 
@@ -156,82 +308,31 @@ def generate_assessment_excel(campusid, subject_id, assessment_type, output_file
         writer.sheets['Assessments'] = worksheet
 
         current_row = 0
-        for idx, assessment in enumerate(assessments, start=1):
-            assessment_id = assessment['assessment_id']
-            fallback_total_marks = assessment['total_marks']
-            created_at = assessment.get('created_at')
-
-            # Fetch student marks for this assessment
-            marks_query = """
-                SELECT S.student_name, S.RFID, AM.Marks_Acheived, AM.total_marks
-                FROM assessments_marks AM
-                JOIN Students S ON S.RFID = AM.rfid
-                WHERE AM.assessment_id = %s AND S.campusid = %s
-            """
-            marks_data = db.fetch_all(marks_query, (assessment_id, campusid))
-
-            data_rows = []
-            for row in marks_data:
-                obtained = row['Marks_Acheived']
-                total = row['total_marks'] or fallback_total_marks or 0
-                percentage = (obtained / total) * 100 if total > 0 else 0
-
-                if percentage >= 95:
-                    grade = 'A++'
-                elif percentage >= 90:
-                    grade = 'A+'
-                elif percentage >= 85:
-                    grade = 'A'
-                elif percentage >= 80:
-                    grade = 'B++'
-                elif percentage >= 75:
-                    grade = 'B+'
-                elif percentage >= 70:
-                    grade = 'B'
-                elif percentage >= 60:
-                    grade = 'C'
-                elif percentage >= 50:
-                    grade = 'D'
-                elif percentage >= 40:
-                    grade = 'U'
-                else:
-                    grade = 'F'
-
-                data_rows.append({
-                    'Student Name': row['student_name'],
-                    'RFID': row['RFID'],
-                    'Marks Achieved': obtained,
-                    'Total Marks': total,
-                    'Percentage': round(percentage, 2),
-                    'Grade': grade
-                })
+        for idx, assessment in enumerate(assessments.to_dict('records'), start=1):
+            df = _assessment_marks_frame(data, assessment)
 
             # Write assessment title
             exam_title = f"{assessment_type} Exam {idx}"
-            if created_at:
-                exam_title += f" ({created_at.strftime('%d-%b-%Y')})"
+            if pd.notna(assessment['created_at']):
+                exam_title += f" ({_exam_date(assessment['created_at'])})"
             worksheet.write(current_row, 0, exam_title)
             current_row += 1
 
             # Write data
-            df = pd.DataFrame(data_rows)
             df.to_excel(writer, sheet_name='Assessments', startrow=current_row, index=False, header=True)
 
             current_row += len(df) + 3  # Leave 3 empty rows before next exam
+            _report_progress(progress, idx, len(assessments))
 
     print(f"Excel report generated with multiple {assessment_type} exams: {output_file}")
 
 
-def generate_all_subjects_assessments_excel(campusid, year, assessment_type, output_file='all_subjects_assessments.xlsx'):
-    # Step 1: Fetch all subjects for given campus and year
-    subjects_query = """
-        SELECT subject_id, subject_name
-        FROM Subjects
-        WHERE CampusID = %s AND year = %s
-    """
-    subjects = db.fetch_all(subjects_query, (campusid, year))
+def generate_all_subjects_assessments_excel(campusid, year, assessment_type, output_file='all_subjects_assessments.xlsx',
+                                            progress=None):
+    # Step 1: Load all subjects, assessments and marks for given campus and year
+    data = ReportData(campusid, year=year, assessment_types=[assessment_type])
 
-    if not subjects:
+    if data.subjects.empty:
         print(" No subjects found for the given campus and year.")
         return
 
@@ -242,7 +343,8 @@ def generate_all_subjects_assessments_excel(campusid, year, assessment_type, out
         writer.sheets['All Assessments'] = worksheet
 
         current_col = 0  # Start writing from column A
-        for subject in subjects:
+        for done, subject in enumerate(data.subjects.to_dict('records')):
+            _report_progress(progress, done, len(data.subjects))
             subject_id = subject['subject_id']
             subject_name = subject['subject_name']
             current_row = 0  # Reset row to top for each subject block
@@ -251,80 +353,27 @@ def generate_all_subjects_assessments_excel(campusid, year, assessment_type, out
             worksheet.write(current_row, current_col, f"Subject: {subject_name} (ID: {subject_id})")
             current_row += 1
 
-            # Step 3: Fetch all assessments for the subject
-            assessments_query = """
-                SELECT A.assessment_id, A.total_marks, A.created_at
-                FROM Assessments A
-                WHERE A.subject_id = %s AND A.assessment_type = %s
-                ORDER BY A.created_at ASC
-            """
-            assessments = db.fetch_all(assessments_query, (subject_id, assessment_type))
+            # Step 3: All assessments for the subject
+            assessments = data.assessments_of(subject_id, assessment_type)
 
-            if not assessments:
+            if assessments.empty:
                 worksheet.write(current_row, current_col, f"No {assessment_type} assessments found.")
                 current_row += 3
                 current_col += 8  # Move to next column block
                 continue
 
-            for idx, assessment in enumerate(assessments, start=1):
-                assessment_id = assessment['assessment_id']
-                fallback_total = assessment['total_marks']
-                created_at = assessment['created_at']
-
-                # Step 4: Fetch student marks for the assessment
-                marks_query = """
-                    SELECT S.student_name, S.RFID, AM.Marks_Acheived, AM.total_marks
-                    FROM assessments_marks AM
-                    JOIN Students S ON S.RFID = AM.rfid
-                    WHERE AM.assessment_id = %s AND S.campusid = %s
-                """
-                marks_data = db.fetch_all(marks_query, (assessment_id, campusid))
-
-                # Format student data
-                data_rows = []
-                for row in marks_data:
-                    obtained = row['Marks_Acheived']
-                    total = row['total_marks'] or fallback_total or 0
-                    percentage = (obtained / total) * 100 if total > 0 else 0
-                    if percentage >= 95:
-                         grade = 'A++'
-                    elif percentage >= 90:
-                         grade = 'A+'
-                    elif percentage >= 85:
-                        grade = 'A'
-                    elif percentage >= 80:
-                        grade = 'B++'
-                    elif percentage >= 75:
-                        grade = 'B+'
-                    elif percentage >= 70:
-                        grade = 'B'
-                    elif percentage >= 60:
-                        grade = 'C'
-                    elif percentage >= 50:
-                         grade = 'D'
-                    elif percentage >= 40:
-                        grade = 'U'
-                    else:
-                        grade = 'F'
-
-                    data_rows.append({
-                        'Student Name': row['student_name'],
-                        'RFID': row['RFID'],
-                        'Marks Achieved': obtained,
-                        'Total Marks': total,
-                        'Percentage': round(percentage, 2),
-                        'Grade': grade
-                    })
+            for idx, assessment in enumerate(assessments.to_dict('records'), start=1):
+                # Step 4: Student marks for the assessment
+                df = _assessment_marks_frame(data, assessment)
 
                 # Step 5: Write assessment heading
                 exam_title = f"{assessment_type} Exam {idx}"
-                if created_at:
-                    exam_title += f" ({created_at.strftime('%d-%b-%Y')})"
+                if pd.notna(assessment['created_at']):
+                    exam_title += f" ({_exam_date(assessment['created_at'])})"
                 worksheet.write(current_row, current_col, exam_title)
                 current_row += 1
 
                 # Write data
-                df = pd.DataFrame(data_rows)
                 df.to_excel(writer, sheet_name='All Assessments', startrow=current_row, startcol=current_col, index=False, header=True)
                 current_row += len(df) + 3  # Padding before next block
 
@@ -335,15 +384,11 @@ def generate_all_subjects_assessments_excel(campusid, year, assessment_type, out
     print(f" Excel report generated for all subjects in campus {campusid} and year {year}: {output_file}")
  # Padding before next block
 
-def generate_all_monthlies_with_quizzes_excel(campusid, year, output_file='monthly_with_quizzes_all_subjects.xlsx'):
-    # Step 1: Get all subjects for this campus and year
-    subjects_query = """
-        SELECT subject_id, subject_name
-        FROM Subjects
-        WHERE CampusID = %s AND year = %s
-    """
-    subjects = db.fetch_all(subjects_query, (campusid, year))
-    if not subjects:
+def generate_all_monthlies_with_quizzes_excel(campusid, year, output_file='monthly_with_quizzes_all_subjects.xlsx',
+                                              progress=None):
+    # Step 1: Load subjects, Monthlies, quizzes and marks for this campus and year
+    data = ReportData(campusid, year=year, assessment_types=['Monthly'])
+    if data.subjects.empty:
         print(" No subjects found.")
         return
 
@@ -353,150 +398,49 @@ def generate_all_monthlies_with_quizzes_excel(campusid, year, output_file='month
 
         current_row = 0
         column_offset = 0  # Used to shift columns for each new subject
+        df = None
 
-        for subject in subjects:
+        for done, subject in enumerate(data.subjects.to_dict('records')):
+            _report_progress(progress, done, len(data.subjects))
             subject_id = subject['subject_id']
             subject_name = subject['subject_name']
 
-            # Step 2: Get all Monthly Assessments for this subject
-            monthlies_query = """
-                SELECT assessment_id, total_marks, created_at
-                FROM Assessments
-                WHERE subject_id = %s AND assessment_type = 'Monthly'
-                ORDER BY created_at ASC
-            """
-            monthlies = db.fetch_all(monthlies_query, (subject_id,))
-            if not monthlies:
+            # Step 2: All Monthly Assessments for this subject
+            monthlies = data.assessments_of(subject_id, 'Monthly')
+            if monthlies.empty:
                 column_offset += 2  # still move to next block
                 continue
 
-            for monthly in monthlies:
-                monthly_id = monthly['assessment_id']
-                monthly_total = monthly['total_marks']
-                monthly_date = monthly['created_at'].strftime("%d-%b-%Y") if monthly['created_at'] else ""
-
-                # Step 3: Get Monthly Marks
-                monthly_marks_query = """
-                    SELECT S.student_name, S.RFID, AM.Marks_Acheived
-                    FROM assessments_marks AM
-                    JOIN Students S ON S.RFID = AM.rfid
-                    WHERE AM.assessment_id = %s AND S.campusid = %s
-                """
-                monthly_marks = db.fetch_all(monthly_marks_query, (monthly_id, campusid))
-                if not monthly_marks:
+            for monthly in monthlies.to_dict('records'):
+                # Steps 3-6: Monthly marks with its quizzes, graded
+                monthly_df = _monthly_with_quizzes_frame(data, subject_id, monthly)
+                if monthly_df is None:
                     continue
-
-                # Create student map
-                student_map = {row['RFID']: {
-                    'Student Name': row['student_name'],
-                    'Monthly Marks': row['Marks_Acheived']
-                } for row in monthly_marks}
-
-                # Step 4: Get all quizzes for this Monthly
-                quizzes_query = """
-                    SELECT quiz_id, quiz_number, total_marks
-                    FROM quizzes
-                    WHERE monthly_assessment_id = %s AND subject_id = %s
-                    ORDER BY quiz_number ASC
-                """
-                quizzes = db.fetch_all(quizzes_query, (monthly_id, subject_id))
-                quiz_ids = [q['quiz_id'] for q in quizzes]
-                quiz_titles = [f"Quiz {q['quiz_number']}" for q in quizzes]
-                quiz_totals = [q['total_marks'] for q in quizzes]
-
-                # Step 5: Get quiz marks
-                if quiz_ids:
-                    quiz_marks_query = f"""
-                        SELECT Q.quiz_id, Q.rfid, Q.marks_achieved
-                        FROM quiz_marks Q
-                        WHERE Q.quiz_id IN ({','.join(['%s'] * len(quiz_ids))})
-                    """
-                    quiz_marks = db.fetch_all(quiz_marks_query, (*quiz_ids,))
-                    for qmark in quiz_marks:
-                        rfid = qmark['rfid']
-                        quiz_id = qmark['quiz_id']
-                        marks = qmark['marks_achieved']
-                        if rfid in student_map:
-                            quiz_idx = quiz_ids.index(quiz_id)
-                            label = quiz_titles[quiz_idx]
-                            student_map[rfid][label] = marks
-
-                # Step 6: Final Calculations
-                final_rows = []
-                for rfid, data in student_map.items():
-                    row = {
-                        'Student Name': data['Student Name'],
-                        'RFID': rfid
-                    }
-
-                    # Add quiz marks
-                    quiz_marks_list = []
-                    for i, title in enumerate(quiz_titles):
-                        mark = data.get(title, 0)
-                        quiz_marks_list.append(mark)
-                        row[title] = mark
-
-                    monthly_obt = data.get('Monthly Marks', 0)
-                    avg_quiz = sum(quiz_marks_list) / len(quiz_marks_list) if quiz_marks_list else 0
-                    total_obtained = monthly_obt + avg_quiz
-                    total_possible = monthly_total + (quiz_totals[0] if quiz_totals else 0)
-                    percentage = (total_obtained / total_possible) * 100 if total_possible > 0 else 0
-
-                    # Grade
-                    if percentage >= 95:
-                         grade = 'A++'
-                    elif percentage >= 90:
-                         grade = 'A+'
-                    elif percentage >= 85:
-                         grade = 'A'
-                    elif percentage >= 80:
-                         grade = 'B++'
-                    elif percentage >= 75:
-                          grade = 'B+'
-                    elif percentage >= 70:
-                         grade = 'B'
-                    elif percentage >= 60:
-                         grade = 'C'
-                    elif percentage >= 50:
-                         grade = 'D'
-                    elif percentage >= 40:
-                         grade = 'U'
-                    else:
-                         grade = 'F'
-
-                    row['Monthly Marks'] = monthly_obt
-                    row['Total Monthly Marks'] = monthly_total
-                    row['Total Obtained'] = round(total_obtained, 2)
-                    row['Percentage'] = round(percentage, 2)
-                    row['Grade'] = grade
-
-                    final_rows.append(row)
-
-                df = pd.DataFrame(final_rows)
+                df = monthly_df
 
                 # Step 7: Write to Excel
-                heading = f"Subject: {subject_name} | Monthly ID: {monthly_id} | Date: {monthly_date}"
+                heading = (f"Subject: {subject_name} | Monthly ID: {monthly['assessment_id']} | "
+                           f"Date: {_exam_date(monthly['created_at'])}")
                 worksheet.write(current_row, column_offset, heading)
                 current_row += 1
                 df.to_excel(writer, sheet_name='All Monthlies', startrow=current_row, startcol=column_offset, index=False)
                 current_row += len(df) + 3
 
             # Step 8: Move two columns after one subject is done
-            column_offset += df.shape[1] + 2
+            column_offset += (df.shape[1] if df is not None else 0) + 2
             current_row = 0  # Reset row so new subject starts from top
 
     print(f" Excel saved: {output_file}")
 
 
-def generate_subject_wise_report(campusid, subjectid, year, output_file='subject_report.xlsx'):
-    # Step 1: Get subject name
-    subject_query = "SELECT subject_name FROM Subjects WHERE subject_id = %s"
-    subject_result = db.fetch_one(subject_query, (subjectid,))
-    if not subject_result:
+def generate_subject_wise_report(campusid, subjectid, year, output_file='subject_report.xlsx', progress=None):
+    # Step 1: Load the subject with all its assessments, quizzes and marks
+    data = ReportData(campusid, subject_id=subjectid)
+    if data.subjects.empty:
         print(" Subject not found.")
         return
 
-    subject_name = subject_result['subject_name']
+    subject_name = data.subjects['subject_name'].iloc[0]
 
     # Step 2: Use exact enum values for assessment_type
     assessment_types = [
@@ -516,182 +460,47 @@ def generate_subject_wise_report(campusid, subjectid, year, output_file='subject
 
         current_row = 0
         column_offset = 0
+        df = None
 
-        for atype in assessment_types:
-            # Step 3: Get all assessments of this type
-            assessments_query = """
-                SELECT assessment_id, total_marks, created_at
-                FROM Assessments
-                WHERE subject_id = %s AND assessment_type = %s
-                ORDER BY created_at ASC
-            """
-            assessments = db.fetch_all(assessments_query, (subjectid, atype))
+        for done, atype in enumerate(assessment_types):
+            _report_progress(progress, done, len(assessment_types))
+            # Step 3: All assessments of this type
+            assessments = data.assessments_of(subjectid, atype)
 
             worksheet.write(current_row, column_offset, f"Subject: {subject_name} | Assessment Type: {atype}")
             current_row += 1
 
-            if not assessments:
+            if assessments.empty:
                 worksheet.write(current_row, column_offset, f"No assessments of type '{atype}' found.")
                 current_row += 4
                 column_offset += 3
                 continue
 
-            for assessment in assessments:
+            for assessment in assessments.to_dict('records'):
                 aid = assessment['assessment_id']
-                total = assessment['total_marks']
-                date = assessment['created_at'].strftime("%d-%b-%Y") if assessment['created_at'] else ""
+                date = _exam_date(assessment['created_at'])
 
                 if atype == 'Monthly':
                     # Monthly logic with quizzes
-                    monthly_marks_query = """
-                        SELECT S.student_name, S.RFID, AM.Marks_Acheived
-                        FROM assessments_marks AM
-                        JOIN Students S ON S.RFID = AM.rfid
-                        WHERE AM.assessment_id = %s AND S.campusid = %s
-                    """
-                    monthly_marks = db.fetch_all(monthly_marks_query, (aid, campusid))
-                    if not monthly_marks:
+                    monthly_df = _monthly_with_quizzes_frame(data, subjectid, assessment)
+                    if monthly_df is None:
                         continue
-
-                    student_map = {row['RFID']: {
-                        'Student Name': row['student_name'],
-                        'Monthly Marks': row['Marks_Acheived']
-                    } for row in monthly_marks}
-
-                    quizzes_query = """
-                        SELECT quiz_id, quiz_number, total_marks
-                        FROM quizzes
-                        WHERE monthly_assessment_id = %s AND subject_id = %s
-                        ORDER BY quiz_number ASC
-                    """
-                    quizzes = db.fetch_all(quizzes_query, (aid, subjectid))
-                    quiz_ids = [q['quiz_id'] for q in quizzes]
-                    quiz_titles = [f"Quiz {q['quiz_number']}" for q in quizzes]
-                    quiz_totals = [q['total_marks'] for q in quizzes]
-
-                    if quiz_ids:
-                        quiz_marks_query = f"""
-                            SELECT quiz_id, rfid, marks_achieved
-                            FROM quiz_marks
-                            WHERE quiz_id IN ({','.join(['%s'] * len(quiz_ids))})
-                        """
-                        quiz_marks = db.fetch_all(quiz_marks_query, (*quiz_ids,))
-                        for qm in quiz_marks:
-                            rfid = qm['rfid']
-                            qid = qm['quiz_id']
-                            marks = qm['marks_achieved']
-                            if rfid in student_map:
-                                idx = quiz_ids.index(qid)
-                                title = quiz_titles[idx]
-                                student_map[rfid][title] = marks
-
-                    final_rows = []
-                    for rfid, data in student_map.items():
-                        row = {
-                            'Student Name': data['Student Name'],
-                            'RFID': rfid
-                        }
-
-                        quiz_marks_list = []
-                        for i, title in enumerate(quiz_titles):
-                            mark = data.get(title, 0)
-                            quiz_marks_list.append(mark)
-                            row[title] = mark
-
-                        monthly_obt = data.get('Monthly Marks', 0)
-                        avg_quiz = sum(quiz_marks_list) / len(quiz_marks_list) if quiz_marks_list else 0
-                        total_obt = monthly_obt + avg_quiz
-                        total_possible = total + (quiz_totals[0] if quiz_totals else 0)
-                        percentage = (total_obt / total_possible) * 100 if total_possible > 0 else 0
-                        if percentage >= 95:
-                            grade = 'A++'
-                        elif percentage >= 90:
-                            grade = 'A+'
-                        elif percentage >= 85:
-                            grade = 'A'
-                        elif percentage >= 80:
-                            grade = 'B++'
-                        elif percentage >= 75:
-                            grade = 'B+'
-                        elif percentage >= 70:
-                            grade = 'B'
-                        elif percentage >= 60:
-                            grade = 'C'
-                        elif percentage >= 50:
-                            grade = 'D'
-                        elif percentage >= 40:
-                            grade = 'U'
-                        else:
-                            grade = 'F'
-
-                        row['Monthly Marks'] = monthly_obt
-                        row['Total Monthly Marks'] = total
-                        row['Total Obtained'] = round(total_obt, 2)
-                        row['Percentage'] = round(percentage, 2)
-                        row['Grade'] = grade
-
-                        final_rows.append(row)
-
-                    df = pd.DataFrame(final_rows)
+                    df = monthly_df
                     worksheet.write(current_row, column_offset, f"Monthly Assessment ID: {aid} | Date: {date}")
-                    current_row += 1
-                    df.to_excel(writer, sheet_name='Subject Report', startrow=current_row, startcol=column_offset, index=False)
-                    current_row += len(df) + 3
-
                 else:
                     # Simple logic for other types
-                    marks_query = """
-                        SELECT S.student_name, S.RFID, AM.Marks_Acheived
-                        FROM assessments_marks AM
-                        JOIN Students S ON S.RFID = AM.rfid
-                        WHERE AM.assessment_id = %s AND S.campusid = %s
-                    """
-                    marks = db.fetch_all(marks_query, (aid, campusid))
-                    if not marks:
+                    marks = data.marks_of(aid)
+                    if marks.empty:
                         continue
-
-                    final_rows = []
-                    for m in marks:
-                        obt = m['Marks_Acheived']
-                        percent = (obt / total) * 100 if total else 0
-                        if percent >= 95:
-                            grade = 'A++'
-                        elif percent >= 90:
-                            grade = 'A+'
-                        elif percent >= 85:
-                            grade = 'A'
-                        elif percent >= 80:
-                            grade = 'B++'
-                        elif percent >= 75:
-                            grade = 'B+'
-                        elif percent >= 70:
-                            grade = 'B'
-                        elif percent >= 60:
-                            grade = 'C'
-                        elif percent >= 50:
-                            grade = 'D'
-                        elif percent >= 40:
-                            grade = 'U'
-                        else:
-                            grade = 'F'
-
-                        final_rows.append({
-                            'Student Name': m['student_name'],
-                            'RFID': m['RFID'],
-                            'Marks Achieved': obt,
-                            'Total Marks': total,
-                            'Percentage': round(percent, 2),
-                            'Grade': grade
-                        })
-
-                    df = pd.DataFrame(final_rows)
+                    df = _graded_marks_frame(marks, pd.Series(_number(assessment['total_marks']), index=marks.index))
                     worksheet.write(current_row, column_offset, f"Assessment ID: {aid} | Date: {date}")
-                    current_row += 1
-                    df.to_excel(writer, sheet_name='Subject Report', startrow=current_row, startcol=column_offset, index=False)
-                    current_row += len(df) + 3
+
+                current_row += 1
+                df.to_excel(writer, sheet_name='Subject Report', startrow=current_row, startcol=column_offset, index=False)
+                current_row += len(df) + 3
 
             # Move to next block
-            column_offset += df.shape[1] + 3
+            column_offset += (df.shape[1] if df is not None else 0) + 3
             current_row = 0
 
     print(f" Subject report saved: {output_file}")
@@ -4,6 +4,8 @@ import os
 import base64
 import time
 from src.DatabaseConnection import Database
+from src.AttendanceBitmap import as_date, count_range
+from src.RosterIndex import roster_index
 from datetime import datetime
 import traceback
 
@@ -74,6 +76,7 @@ def add_student():
         print(f"Values: {values}")
 
         db.execute_query(sql, values)
+        roster_index.invalidate(campus_id)
         print("✅ Student added successfully with image.")
 
         return jsonify({"success": True, "message": "Student added with photo."}), 201
@@ -89,7 +92,7 @@ def get_student_details():
     try:
         rfid = request.args.get("rfid", type=int)
         query = "SELECT student_name, RFID, year, phone_number, picture_url FROM Students WHERE RFID = %s"
-        student = db.fetch_one(query, (rfid,))
+        student = db.fetch_one(query, (rfid,), prepared=True)
 
         if not student:
             return jsonify({"message": "Student not found"}), 404
@@ -126,7 +129,7 @@ def get_student_attendance():
     try:
         rfid = request.args.get("rfid", type=int)
         query = "SELECT TotalDays, DaysAttended FROM Students WHERE RFID = %s"
-        attendance = db.fetch_one(query, (rfid,))
+        attendance = db.fetch_one(query, (rfid,), prepared=True)
 
         if not attendance:
             return jsonify({"message": "No attendance data available"}), 404
@@ -135,6 +138,12 @@ def get_student_attendance():
             (attendance["DaysAttended"] * 100.0 / attendance["TotalDays"]), 2
         ) if attendance["TotalDays"] > 0 else 0
 
+        # Optional ?from=YYYY-MM-DD&to=YYYY-MM-DD window, answered from the attendance bitmap.
+        start, end = request.args.get("from"), request.args.get("to")
+        if start and end:
+            attendance["Range"] = {"from": start, "to": end,
+                                   **count_range(rfid, as_date(start), as_date(end))}
+
         return jsonify(attendance)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -31,7 +31,7 @@ def get_subjects():
 def get_teachers():
     try:
         sql = "SELECT id AS id, name AS name FROM Teacher"
-        teachers = db.fetch_all(sql)
+        teachers = db.fetch_all(sql, cache_ttl=300)
         return jsonify(teachers), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -41,7 +41,7 @@ def get_teachers():
 def get_campuses():
     try:
         sql = "SELECT campusid AS campusId, campusname AS campusName FROM Campus"
-        campuses = db.fetch_all(sql)
+        campuses = db.fetch_all(sql, cache_ttl=300)
         return jsonify(campuses), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
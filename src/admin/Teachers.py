@@ -31,7 +31,7 @@ def get_teacher(teacher_id):
 def get_campuses():
     try:
         query = "SELECT CampusID, CampusName FROM Campus"
-        result = db.fetch_all(query)
+        result = db.fetch_all(query, cache_ttl=300)
 
         print("Query Result:", repr(result))  # Better debugging output
 
@@ -46,8 +46,8 @@ def get_or_create_chat_room():
             return jsonify({"room_id": existing["room_id"]}), 200
 
         sql_insert = "INSERT INTO ChatRooms (subject_id, created_at) VALUES (%s, NOW())"
-        db.execute_query(sql_insert, (subject_id,))
-        room_id = db.fetch_one("SELECT LAST_INSERT_ID() AS room_id")['room_id']
+        with db.transaction() as tx:
+            room_id = tx.execute(sql_insert, (subject_id,))
         return jsonify({"room_id": room_id}), 200
     except Exception as e:
         print("Error creating chat room:", e)
@@ -69,7 +69,7 @@ def send_message():
             INSERT INTO Messages (room_id, sender_rfid, message_text, sent_at)
             VALUES (%s, %s, %s, NOW())
         """
-        db.execute_query(sql, (room_id, sender_rfid, message_text))
+        db.execute_query(sql, (room_id, sender_rfid, message_text), prepared=True)
         return jsonify({"success": True}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -84,22 +84,28 @@ def mark_messages_as_read():
         return jsonify({'error': 'Missing message_ids or reader_rfid'}), 400
 
     try:
-        for message_id in message_ids:
-            # Check if the read receipt already exists
-            check_sql = """
-                SELECT 1 FROM ReadReceipts
-                WHERE message_id = %s AND reader_rfid = %s
+        with db.transaction() as tx:
+            # Skip messages this reader has already read
+            placeholders = ','.join(['%s'] * len(message_ids))
+            check_sql = f"""
+                SELECT message_id FROM ReadReceipts
+                WHERE reader_rfid = %s AND message_id IN ({placeholders})
             """
-            exists = db.fetch_one(check_sql, (message_id, reader_rfid))
-            if exists:
-                continue  # Skip if already marked as read
-
-            # Insert read receipt
+            # Compared as strings: clients may send ids as text, MySQL returns ints.
+            already_read = {
+                str(row['message_id']) for row in tx.fetch_all(check_sql, (reader_rfid, *message_ids))
+            }
+            unread = {}
+            for message_id in message_ids:
+                if str(message_id) not in already_read:
+                    unread.setdefault(str(message_id), message_id)
+
+            # Insert the remaining read receipts in one statement
             insert_sql = """
                 INSERT INTO ReadReceipts (message_id, reader_rfid, read_at)
                 VALUES (%s, %s, NOW())
             """
-            db.execute_query(insert_sql, (message_id, reader_rfid))
+            tx.execute_many(insert_sql, [(message_id, reader_rfid) for message_id in unread.values()])
 
         return jsonify({"success": True}), 200
     except Exception as e:
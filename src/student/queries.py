@@ -47,9 +47,8 @@ def submit_query():
             INSERT INTO queries (student_rfid, subject_id, question)
             VALUES (%s, %s, %s)
         """
-        db.execute_query(sql, (student_rfid, subject_id, question))
-
-        new_id = db.fetch_one("SELECT LAST_INSERT_ID() AS id")['id']
+        with db.transaction() as tx:
+            new_id = tx.execute(sql, (student_rfid, subject_id, question))
         return jsonify({'id': new_id}), 201
     except Exception as e:
         return jsonify({'error': str(e)}), 500